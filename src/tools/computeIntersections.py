@@ -1,9 +1,14 @@
 import arcpy
 import os
-import shapely
-from shapely.geometry import Point
+import uuid
+from contextlib import nullcontext
+import numpy as np
 from tools.utils.intersect_lines import IntersectLines
-from tools.utils.generic_funs import get_geodatabase_path, create_new_fields
+from tools.utils.intersection_engine import (TransectIndex, intersection_fingerprint, cross_shore_distances,
+                                             resolve_multiple_intersections, shared_transects)
+from tools.utils.generic_funs import (get_geodatabase_path, create_new_fields, add_fields_like, load_attributes,
+                                     load_rows, load_geometries, iter_geometries, get_process_pool, resolve_workers)
+from tools.utils.geometry_cache import DATASET_CACHE
 
 
 class ComputeIntersection(object):
@@ -62,7 +67,63 @@ class ComputeIntersection(object):
             parameterType="Required",
             direction="Output")
 
-        parameters = [baseline_param, shoreline_param, shore_id_param, transects_param, baseline_points_param, shoreline_points_param]
+        engine_param = arcpy.Parameter(
+            displayName="Intersection Engine",
+            name="engine",
+            datatype="GPString",
+            parameterType="Optional",
+            direction="Input")
+        engine_param.filter.type = "ValueList"
+        engine_param.filter.list = ["GEOS", "Analytic"]
+        engine_param.value = "GEOS"
+
+        shore_fields_param = arcpy.Parameter(
+            displayName="Shoreline Fields To Carry (empty = all, 'date' is always carried)",
+            name="shore_fields",
+            datatype="Field",
+            parameterType="Optional",
+            direction="Input",
+            multiValue=True)
+        shore_fields_param.parameterDependencies = [shoreline_param.name]
+
+        chunk_size_param = arcpy.Parameter(
+            displayName="Shoreline Chunk Size (0 = read all the shorelines at once)",
+            name="chunk_size",
+            datatype="GPLong",
+            parameterType="Optional",
+            direction="Input")
+        chunk_size_param.value = 0
+        chunk_size_param.filter.type = "Range"
+        chunk_size_param.filter.list = [0, 10000000]
+
+        append_param = arcpy.Parameter(
+            displayName="Append New Shorelines Only",
+            name="append_mode",
+            datatype="GPBoolean",
+            parameterType="Optional",
+            direction="Input")
+        append_param.value = False
+
+        workers_param = arcpy.Parameter(
+            displayName="Parallel workers (1 = serial, 0 = all cores)",
+            name="workers",
+            datatype="GPLong",
+            parameterType="Optional",
+            direction="Input")
+        workers_param.value = 1
+
+        multiple_param = arcpy.Parameter(
+            displayName="Multiple Intersections (point kept when a shoreline crosses a transect several times)",
+            name="multiple_intersections",
+            datatype="GPString",
+            parameterType="Optional",
+            direction="Input")
+        multiple_param.filter.type = "ValueList"
+        multiple_param.filter.list = ["Closest", "Farthest", "Seaward-most", "Median", "All"]
+        multiple_param.value = "Closest"
+
+        parameters = [baseline_param, shoreline_param, shore_id_param, transects_param, baseline_points_param, shoreline_points_param,
+                      engine_param, shore_fields_param, chunk_size_param, append_param, workers_param, multiple_param]
 
         return parameters
 
@@ -101,6 +162,12 @@ class ComputeIntersection(object):
         transectsID = "transect_id"
         baseOutFeature = parameters[4].valueAsText
         shoreOutFeature = parameters[5].valueAsText
+        engine = parameters[6].valueAsText or "GEOS"
+        shoreFieldsToCarry = parameters[7].valueAsText.split(";") if parameters[7].valueAsText else []
+        shoreChunkSize = int(parameters[8].value or 0)
+        appendMode = bool(parameters[9].value)
+        workers = resolve_workers(parameters[10].value if parameters[10].value is not None else 1)
+        multiplePolicy = parameters[11].valueAsText or "Closest"
 
         #  == Convert ArcGIS geometry to Shapely geometry ==
         # Check if the baseline has multiple features
@@ -111,25 +178,46 @@ class ComputeIntersection(object):
         if baseHasMultipleFeatures:
             baseShapely = IntersectLines.line_arcgis2shapely(baseFeature, 'baseline_id')  # dict
             # Get mapping of transect_id to baseline_id
-            transect_baseline_map = {}
-            with arcpy.da.SearchCursor(transectsFeature, ['transect_id', 'baseline_id']) as cursor:
-                for row in cursor:
-                    transect_baseline_map[row[0]] = row[1]
+            transect_baseline_df = load_attributes(transectsFeature, ['transect_id', 'baseline_id'])
+            transect_baseline_map = dict(zip(transect_baseline_df['transect_id'], transect_baseline_df['baseline_id']))
         else:
             baseShapely = IntersectLines.line_arcgis2shapely(baseFeature, None)  # list
             transect_baseline_map = None
         
-        # Shorelines
-        shoreShapely = IntersectLines.line_arcgis2shapely(shoreFeature, shoreID)
-        # Transects
+        # Transects (the spatial index is built once and reused for all the shorelines)
         transectsShapely = IntersectLines.line_arcgis2shapely(transectsFeature, transectsID)
+        transectsIndex = TransectIndex(transectsShapely)
+        # The shorelines are read later (at once or in chunks)
 
         # == Create two empty Feature Classes for the intersections (baseline and shorelines)
         # Get the spatial reference
         sr = arcpy.Describe(parameters[0].valueAsText).spatialReference
+        # Get the gdb path
+        gdb_path = get_geodatabase_path(baseOutFeature)
+
+        # Fields of the shoreline points: the transect_id, shore_id and the distance from baseline
+        fields_to_add = [transectsID, shoreID, "distance_from_base"]
+        data_type = ["SHORT", "SHORT", "DOUBLE"]
+        # Other fields of the Polyline Shorelines Feature Class (attached while inserting the points)
+        fieldsToJoin = [field for field in arcpy.ListFields(shoreFeature)
+                        if "object" not in field.name.lower()
+                        and "shape" not in field.name.lower()
+                        and field.name.lower() != shoreID
+                        and field.name not in fields_to_add + ["creation_id"]
+                        and (not shoreFieldsToCarry or field.name in shoreFieldsToCarry or field.name.lower() == "date")]
+        fieldNames = [field.name for field in fieldsToJoin]
+        emptyAttributes = (None,) * len(fieldsToJoin)
+
+        # Fingerprint of the transects, baseline, engine and policy used to compute the intersection points
+        sourceFp = intersection_fingerprint(transectsShapely, baseShapely, engine, multiplePolicy, "signed distance",
+                                            sorted(transect_baseline_map.items()) if transect_baseline_map else None)
+        # In append mode, only the shorelines not yet in the output are intersected (if the outputs are still valid)
+        appendShorelines = appendMode and self._can_append(baseOutFeature, shoreOutFeature, shoreID, fieldNames, sourceFp)
+        if appendMode and not appendShorelines:
+            arcpy.AddMessage("The transects, the baseline or the outputs changed: all the intersections are recomputed.")
         
         #  == 1. Baseline Intersection Points ==
-        # Get the intersection points
+        # Get the intersection points (also needed in append mode to compute the distances)
         basePoints = IntersectLines.intersect_baseline(
             transectsShapely, 
             baseShapely, 
@@ -137,118 +225,125 @@ class ComputeIntersection(object):
             transect_baseline_map=transect_baseline_map
         )
         
-        # Check if the output feature class exists and delete it
-        if arcpy.Exists(baseOutFeature):
-            arcpy.Delete_management(baseOutFeature)
-        # Get the gdb path and the output fc name
-        gdb_path = get_geodatabase_path(baseOutFeature)
-        baseOutFeature_name = os.path.basename(baseOutFeature)
-        # Create the feature class
-        arcpy.management.CreateFeatureclass(out_path=gdb_path,
-                                            out_name=baseOutFeature_name,
-                                            geometry_type="POINT",
-                                            spatial_reference=sr)
-        # Add the transect_id field
-        arcpy.management.AddField(baseOutFeature, transectsID, 'SHORT')
-        # Fill with the geometries (intersection points) and the transect_id
-        with arcpy.da.InsertCursor(baseOutFeature, [transectsID, "SHAPE@"]) as cursor:
-            for id, point in basePoints.items():
-                # Validate that the intersection exists and has coordinates
-                if point and not point.is_empty and hasattr(point, 'coords'):
-                    coords_list = list(point.coords)
-                    if len(coords_list) > 0:
-                        # Create the arcgis point
-                        arc_Point = arcpy.Point(coords_list[0][0], coords_list[0][1])
-                        # Insert the row with the id and the point
-                        cursor.insertRow([id, arc_Point])
-                    else:
-                        arcpy.AddWarning(f"Transect {id}: Empty coordinates in baseline intersection")
-                else:
-                    arcpy.AddWarning(f"Transect {id}: No baseline intersection found")
-
-        #  == 2. Shoreline Intersection Points ==
-        # Get the intersection points
-        shorePoints = IntersectLines.intersect_shorelines(transectsShapely, shoreShapely) # dict
-        
-        # Check if the output feature class exists and delete it
-        if arcpy.Exists(shoreOutFeature):
-            arcpy.Delete_management(shoreOutFeature)
-        # Get the output fc name
-        shoreOutFeature_name = os.path.basename(shoreOutFeature)
-        # Create the feature class
-        arcpy.management.CreateFeatureclass(out_path=gdb_path,
-                                            out_name=shoreOutFeature_name,
-                                            geometry_type="POINT",
-                                            spatial_reference=sr)
-        # Add the transect_id, shore_id and the distance from baseline fields
-        fields_to_add = [transectsID, shoreID, "distance_from_base"]
-        data_type = ["SHORT", "SHORT", "DOUBLE"]
-        create_new_fields(shoreOutFeature, fields_to_add, data_type)
-        
-        """
-        Iterate over the shorePoints (dictionary). The keys are tuples with the ids of the transects and shorelines.
-        If the value is a list, add the key as many times as the length of the list (to match the number of geometries with the number of ids).
-        """
-        # Fill with the geometries (intersection points) and the transect_id and shore_id
-        with arcpy.da.InsertCursor(shoreOutFeature, [transectsID, shoreID, "SHAPE@"]) as cursor:
-            for t_id_shore_id, point in shorePoints.items():
-                if isinstance(point, list): # The intersection point is a list of points (MultiPoint)
-                    for part in point:
-                        # Validate that the point has coordinates
-                        if part and not part.is_empty and hasattr(part, 'coords'):
-                            coords_list = list(part.coords)
-                            if len(coords_list) > 0:
-                                # Create the arcgis point
-                                arc_Point = arcpy.Point(coords_list[0][0], coords_list[0][1])
-                                # Insert the row with the transect_id and shore_id and the point
-                                cursor.insertRow([t_id_shore_id[0], t_id_shore_id[1], arc_Point])
-                else:
-                    # Validate that the point has coordinates
+        if not appendShorelines:
+            # Check if the output feature class exists and delete it
+            if arcpy.Exists(baseOutFeature):
+                arcpy.Delete_management(baseOutFeature)
+            # Get the output fc name
+            baseOutFeature_name = os.path.basename(baseOutFeature)
+            # Create the feature class
+            arcpy.management.CreateFeatureclass(out_path=gdb_path,
+                                                out_name=baseOutFeature_name,
+                                                geometry_type="POINT",
+                                                spatial_reference=sr)
+            # Add the transect_id field and the fingerprint of the inputs
+            arcpy.management.AddField(baseOutFeature, transectsID, 'SHORT')
+            arcpy.management.AddField(baseOutFeature, "source_fp", "TEXT", field_length=40)
+            # Fill with the geometries (intersection points) and the transect_id
+            with arcpy.da.InsertCursor(baseOutFeature, [transectsID, "SHAPE@", "source_fp"]) as cursor:
+                for id, point in basePoints.items():
+                    # Validate that the intersection exists and has coordinates
                     if point and not point.is_empty and hasattr(point, 'coords'):
                         coords_list = list(point.coords)
                         if len(coords_list) > 0:
                             # Create the arcgis point
                             arc_Point = arcpy.Point(coords_list[0][0], coords_list[0][1])
-                            # Insert the row with the transect_id and shore_id and the point
-                            cursor.insertRow([t_id_shore_id[0], t_id_shore_id[1], arc_Point])
+                            # Insert the row with the id and the point
+                            cursor.insertRow([id, arc_Point, sourceFp])
+                        else:
+                            arcpy.AddWarning(f"Transect {id}: Empty coordinates in baseline intersection")
+                    else:
+                        arcpy.AddWarning(f"Transect {id}: No baseline intersection found")
 
-        # Add the other fields of the Polyline Shorelines Feature Class
-        # Get the fields to join
-        fieldsToJoin = [field.name for field in arcpy.ListFields(shoreFeature)
-                        if "object" not in field.name.lower()
-                        and "shape" not in field.name.lower()
-                        and field.name.lower() != shoreID]
-        # Join the fields
-        arcpy.management.JoinField(
-            in_data=shoreOutFeature,
-            in_field=shoreID,
-            join_table=shoreFeature,
-            join_field=shoreID,
-            fields=fieldsToJoin,
-            fm_option="NOT_USE_FM",
-            field_mapping=None
-        )
+        #  == 2. Shoreline Intersection Points ==
+        if appendShorelines:
+            # Shorelines already intersected (their rows are left untouched) and ID of the run that created the output
+            existingShoreIds, creationId = set(), None
+            with arcpy.da.SearchCursor(shoreOutFeature, [shoreID, "creation_id"]) as cursor:
+                for row in cursor:
+                    existingShoreIds.add(row[0])
+                    creationId = creationId or row[1]
+            creationId = creationId or uuid.uuid4().hex
+        else:
+            existingShoreIds = set()
+            # New ID of the output, so other tools (e.g. the incremental analysis) can tell it was recreated
+            creationId = uuid.uuid4().hex
+            # Check if the output feature class exists and delete it
+            if arcpy.Exists(shoreOutFeature):
+                arcpy.Delete_management(shoreOutFeature)
+            # Get the output fc name
+            shoreOutFeature_name = os.path.basename(shoreOutFeature)
+            # Create the feature class
+            arcpy.management.CreateFeatureclass(out_path=gdb_path,
+                                                out_name=shoreOutFeature_name,
+                                                geometry_type="POINT",
+                                                spatial_reference=sr)
+            # Add the transect_id, shore_id, the distance from baseline and the shoreline fields
+            create_new_fields(shoreOutFeature, fields_to_add, data_type)
+            add_fields_like(shoreOutFeature, fieldsToJoin)
+            arcpy.management.AddField(shoreOutFeature, "creation_id", "TEXT", field_length=32)
+
+        if shoreChunkSize:
+            # Streaming: the shorelines and their attributes are read in chunks with a single cursor, so the memory
+            # used does not depend on the number of shorelines
+            shoreChunks = iter_geometries(shoreFeature, shoreID, fieldNames, shoreChunkSize)
+        else:
+            # All the shorelines at once (from the session cache if they were already read)
+            shoreIds, shoreGeoms = load_geometries(shoreFeature, shoreID)
+            # Raw cursor values (as in the streaming mode), so null integers and dates are written as nulls
+            shoreRows = load_rows(shoreFeature, [shoreID] + fieldNames)
+            shoreChunks = [(shoreIds, shoreGeoms, map(tuple, shoreRows[:, 1:]))]
+
+        # Baseline intersection of each transect, in the order of the transect index (NaN if missing)
+        baseXY = np.array([(basePoints[t].x, basePoints[t].y) if t in basePoints else (np.nan, np.nan)
+                           for t in transectsIndex.ids.tolist()], dtype=float).reshape(-1, 2)
+        # Transects already warned about a missing baseline intersection
+        warnedTransects = set()
+        newShorelines = 0
+        # Fill with the geometries (intersection points), the transect_id, the shore_id, the distance from baseline
+        # and the attributes of the shoreline
+        # The process pool (if any) and the transects shared with its workers are reused by all the chunks of shorelines
+        with get_process_pool(workers) if workers > 1 else nullcontext() as pool, \
+             shared_transects(transectsIndex) if workers > 1 else nullcontext() as transectSpecs, \
+             arcpy.da.InsertCursor(shoreOutFeature, [transectsID, shoreID, "SHAPE@XY", "distance_from_base", "creation_id"]
+                                   + fieldNames) as cursor:
+            for chunkIds, chunkGeoms, chunkRows in shoreChunks:
+                # Attributes of each new shoreline by shore_id (the first row is used if an ID is repeated, as in a join)
+                shoreAttributes, shoreShapely = {}, {}
+                for shore_id, geom, values in zip(chunkIds.tolist(), chunkGeoms, chunkRows):
+                    if shore_id in existingShoreIds:
+                        continue
+                    shoreAttributes.setdefault(shore_id, tuple(values))
+                    shoreShapely[shore_id] = geom
+                if not shoreShapely:
+                    continue
+                newShorelines += len(shoreShapely)
+
+                # Get the intersection points
+                shorePoints = IntersectLines.intersect_shorelines(transectsIndex, shoreShapely, engine=engine,
+                                                                  pool=pool, workers=workers,
+                                                                  transect_specs=transectSpecs) # structured array
+
+                # == Calculate distances from baseline to shoreline points ==
+                # The baseline intersection points are still in memory, so the distances are computed before writing the points
+                distances = self._distances_from_base(shorePoints, transectsIndex, baseXY, warnedTransects)
 
-        # == Calculate distances from baseline to shoreline points ==
-        # Read the geometries of the baseOutFeature (baseline intersection points)
-        basePoints = IntersectLines.point_arcgis2shapely(baseOutFeature, transectsID)
-        # Update the distance_from_base field from the shoreOutFeature
-        with arcpy.da.UpdateCursor(shoreOutFeature, ["SHAPE@", transectsID, "distance_from_base"]) as cursor:
-            for row in cursor:
-                transect_id = row[1]
-                # Check if this transect has a baseline intersection
-                if transect_id in basePoints:
-                    # Get the geometry of the point
-                    shore_shapely_geom = Point([(geom.X, geom.Y) for geom in row[0]][0])
-                    # Calculate the distance from the baseline
-                    row[2] = basePoints[transect_id].distance(shore_shapely_geom)
-                    # Update the row
-                    cursor.updateRow(row)
-                else:
-                    # If no baseline intersection, set distance to None and log warning
-                    arcpy.AddWarning(f"Transect {transect_id}: Cannot calculate distance - no baseline intersection found")
-                    row[2] = None
-                    cursor.updateRow(row)
+                # Keep one point per transect and shoreline (unless all the points are requested)
+                selected = resolve_multiple_intersections(shorePoints, distances, multiplePolicy)
+                shorePoints, distances = shorePoints[selected], distances[selected]
+                distances = [None if np.isnan(d) else d for d in distances.tolist()]
+
+                for transect_id, shore_id, x, y, distance in zip(shorePoints['transect_id'].tolist(),
+                                                                shorePoints['shore_id'].tolist(),
+                                                                shorePoints['x'].tolist(), shorePoints['y'].tolist(),
+                                                                distances):
+                    cursor.insertRow((transect_id, shore_id, (x, y), distance, creationId)
+                                     + shoreAttributes.get(shore_id, emptyAttributes))
+
+        if appendShorelines:
+            arcpy.AddMessage(f"{newShorelines} new shorelines intersected and appended "
+                             f"({len(existingShoreIds)} already in the output).")
+        arcpy.AddMessage(f"Dataset cache: {DATASET_CACHE.stats()}")
         return
 
 
@@ -289,3 +384,57 @@ class ComputeIntersection(object):
         shorelineFeature.symbology = sym
 
         return
+
+    def _can_append(self, baseOutFeature, shoreOutFeature, shoreID, fieldNames, sourceFp):
+        """
+        Private method to check if the new shorelines can be appended to the existing outputs: both must exist,
+        the baseline points must have been computed from the same transects, baseline and engine (same
+        fingerprint) and the shoreline points must have all the fields to fill (including the creation_id).
+
+        Parameters:
+            baseOutFeature (str): Baseline intersection points feature class.
+            shoreOutFeature (str): Shoreline intersection points feature class.
+            shoreID (str): Name of the shoreline ID field.
+            fieldNames (list): Names of the shoreline fields carried to the points.
+            sourceFp (str): Fingerprint of the current transects, baseline and engine.
+
+        Returns:
+            bool: True if the outputs are still valid and the new shorelines can be appended.
+        """
+        if not (arcpy.Exists(baseOutFeature) and arcpy.Exists(shoreOutFeature)):
+            return False
+        if "source_fp" not in [f.name for f in arcpy.ListFields(baseOutFeature)]:
+            return False
+        shoreFields = [f.name for f in arcpy.ListFields(shoreOutFeature)]
+        if any(field not in shoreFields for field in ["transect_id", shoreID, "distance_from_base", "creation_id"] + fieldNames):
+            return False
+        with arcpy.da.SearchCursor(baseOutFeature, ["source_fp"]) as cursor:
+            fingerprints = {row[0] for row in cursor}
+        return fingerprints == {sourceFp}
+
+    def _distances_from_base(self, shorePoints, transectsIndex, baseXY, warnedTransects=None):
+        """
+        Private method to compute the signed distance from the baseline of each shoreline point, projected onto
+        the direction of its transect (positive seaward, negative landward of the baseline).
+
+        Parameters:
+            shorePoints (np.ndarray): Structured array with the shoreline intersection points (see IntersectLines).
+            transectsIndex (TransectIndex): Index of the transects.
+            baseXY (np.ndarray): Baseline intersection of each transect of the index (NaN if missing).
+            warnedTransects (set): Transect IDs already warned about (updated in place to warn only once across chunks).
+
+        Returns:
+            np.ndarray: Distance from the baseline of each shoreline point (NaN if its transect has no baseline intersection).
+        """
+        distances = cross_shore_distances(shorePoints, transectsIndex, baseXY)
+        transect_ids = shorePoints['transect_id']
+
+        # Warn once per transect without baseline intersection
+        warnedTransects = set() if warnedTransects is None else warnedTransects
+        for transect_id in np.unique(transect_ids[np.isnan(distances)]).tolist():
+            if transect_id in warnedTransects:
+                continue
+            warnedTransects.add(transect_id)
+            arcpy.AddWarning(f"Transect {transect_id}: Cannot calculate distance - no baseline intersection found")
+
+        return distances
@@ -1,5 +1,6 @@
 import arcpy, os
 from tools.utils.transect_processor import TransectGenerator
+from tools.utils.transect_engine import assign_baseline_ids
 
 
 class GenerateTransects(object):
@@ -55,7 +56,46 @@ class GenerateTransects(object):
             parameterType="Required",
             direction="Output")
 
-        parameters = [in_features, distance_parameter, length_parameter, sea_side, out_features]
+        # Orientation smoothing window parameter
+        window_parameter = arcpy.Parameter(
+            displayName="Smoothing window (transects on each side)",
+            name="window_points",
+            datatype="GPLong",
+            parameterType="Optional",
+            direction="Input")
+        window_parameter.value = 5
+        window_parameter.filter.type = "Range"
+        window_parameter.filter.list = [0, 10000]
+
+        # Parallel workers parameter (only used when the baseline has multiple features)
+        workers_parameter = arcpy.Parameter(
+            displayName="Parallel workers (1 = serial, 0 = all cores)",
+            name="workers",
+            datatype="GPLong",
+            parameterType="Optional",
+            direction="Input")
+        workers_parameter.value = 1
+
+        # Repair crossing transects parameter
+        repair_parameter = arcpy.Parameter(
+            displayName="Repair crossing transects",
+            name="repair_crossings",
+            datatype="GPBoolean",
+            parameterType="Optional",
+            direction="Input")
+        repair_parameter.value = False
+
+        # Incremental update parameter
+        incremental_parameter = arcpy.Parameter(
+            displayName="Only regenerate the transects of the modified baseline features",
+            name="incremental",
+            datatype="GPBoolean",
+            parameterType="Optional",
+            direction="Input")
+        incremental_parameter.value = False
+
+        parameters = [in_features, distance_parameter, length_parameter, sea_side, out_features, window_parameter,
+                      workers_parameter, repair_parameter, incremental_parameter]
 
         return parameters
 
@@ -98,6 +138,10 @@ class GenerateTransects(object):
         lengthValue = parameters[2].valueAsText
         seaSide = parameters[3].valueAsText
         outFeatures = parameters[4].valueAsText
+        windowPoints = parameters[5].value if parameters[5].value is not None else 5
+        workers = parameters[6].value if parameters[6].value is not None else 1
+        repairCrossings = bool(parameters[7].value)
+        incremental = bool(parameters[8].value)
         
         # Check if the baseline feature class has multiple features. 
         # If so, generate an ID field for the baseline features and propagate the ID field to the transects features.
@@ -105,12 +149,20 @@ class GenerateTransects(object):
         featureCount = int(arcpy.management.GetCount(inFeatures).getOutput(0))
         if featureCount > 1:
             # Add an ID field to the baseline feature class
-            arcpy.management.AddField(inFeatures, "baseline_id", 'SHORT')
-            # Calculate baseline_id with sequential numbers starting from 1
+            hasBaselineId = "baseline_id" in [f.name for f in arcpy.ListFields(inFeatures)]
+            if not hasBaselineId:
+                arcpy.management.AddField(inFeatures, "baseline_id", 'SHORT')
+            # Calculate baseline_id with sequential numbers starting from 1.
+            # In incremental mode, the features keep their baseline_id (the transects are matched by it), so
+            # deleting or re-digitising a feature does not shift the IDs of the others: only the new features are numbered.
+            with arcpy.da.SearchCursor(inFeatures, ["baseline_id"]) as cursor:
+                currentIds = [row[0] for row in cursor]
+            baselineIds = assign_baseline_ids(currentIds, keep_existing=incremental and hasBaselineId)
             with arcpy.da.UpdateCursor(inFeatures, ["baseline_id"]) as cursor:
-                for i, row in enumerate(cursor, start=1):
-                    row[0] = i
-                    cursor.updateRow(row)
+                for row, baselineId in zip(cursor, baselineIds):
+                    if row[0] != baselineId:
+                        row[0] = baselineId
+                        cursor.updateRow(row)
 
         # Extract numeric values from the distance and length parameters
         distance_meters = float(distanceValue.split()[0])
@@ -123,7 +175,11 @@ class GenerateTransects(object):
             distance=distance_meters,
             length=length_meters,
             sea_side=seaSide,
-            output_fc=outFeatures
+            output_fc=outFeatures,
+            window_points=int(windowPoints),
+            workers=int(workers),
+            repair_crossings=repairCrossings,
+            incremental=incremental
         )
         generator.generate_transects()
         
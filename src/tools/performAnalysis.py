@@ -2,8 +2,13 @@ import arcpy
 import pandas as pd
 import numpy as np
 import os
-from tools.utils.shoreline_evolution import ShorelineEvolution
-from tools.utils.generic_funs import create_new_fields
+from tools.utils.shoreline_evolution import (TransectPartition, compute_metrics_batched, compute_metrics_chunk,
+                                            compute_metrics_parallel, STATISTICS_FIELDS, update_sufficient_statistics,
+                                            metrics_from_statistics, theil_sen_batched, robust_irls_batched,
+                                            closest_to_baseline)
+from tools.utils.generic_funs import (get_geodatabase_path, create_new_fields, load_attributes, get_process_pool,
+                                     resolve_workers)
+from tools.utils.geometry_cache import DATASET_CACHE
 
 class PerformAnalysis(object):
     def __init__(self):
@@ -31,7 +36,46 @@ class PerformAnalysis(object):
             direction="Input")
         transects_param.filter.list = ["Polyline"]
 
-        parameters = [shoreline_param, transects_param]
+        engine_param = arcpy.Parameter(
+            displayName="Regression Engine",
+            name="engine",
+            datatype="GPString",
+            parameterType="Optional",
+            direction="Input")
+        engine_param.filter.type = "ValueList"
+        engine_param.filter.list = ["Batched", "Per transect"]
+        engine_param.value = "Batched"
+
+        # Parallel workers parameter (only used by the per transect engine)
+        workers_param = arcpy.Parameter(
+            displayName="Parallel workers (1 = serial, 0 = all cores)",
+            name="workers",
+            datatype="GPLong",
+            parameterType="Optional",
+            direction="Input")
+        workers_param.value = 1
+
+        # Analysis mode parameter
+        mode_param = arcpy.Parameter(
+            displayName="Analysis Mode (Incremental: only the new points; Verify: refit and compare with the incremental update)",
+            name="mode",
+            datatype="GPString",
+            parameterType="Optional",
+            direction="Input")
+        mode_param.filter.type = "ValueList"
+        mode_param.filter.list = ["Full", "Incremental", "Verify"]
+        mode_param.value = "Full"
+
+        # Robust rates parameter
+        robust_param = arcpy.Parameter(
+            displayName="Compute Robust Rates (Theil-Sen and Huber)",
+            name="robust",
+            datatype="GPBoolean",
+            parameterType="Optional",
+            direction="Input")
+        robust_param.value = False
+
+        parameters = [shoreline_param, transects_param, engine_param, workers_param, mode_param, robust_param]
 
         return parameters
 
@@ -56,53 +100,65 @@ class PerformAnalysis(object):
         shoreFeatures = parameters[0].valueAsText
         transectsFeature = parameters[1].valueAsText
         transectsID = "transect_id"
+        engine = parameters[2].valueAsText or "Batched"
+        workers = resolve_workers(parameters[3].value if parameters[3].value is not None else 1)
+        mode = parameters[4].valueAsText or "Full"
+        robust = bool(parameters[5].value)
         
-        # Get the data from the Shoreline Intersection Points Feature Class
-        cursor = arcpy.da.SearchCursor(shoreFeatures, [transectsID, "date", "distance_from_base"])
-        # Create a DataFrame with the data
-        df = pd.DataFrame(data=[row for row in cursor], columns=[transectsID, "date", "distance_from_base"])
-        
-        # For the multiple intersections, keep only the minimum distance from the base for each transect and date.
-        if df[[transectsID, "date"]].duplicated(keep=False).sum() != 0: # If there are multiple intersections
-            # Keep only the minimum distance from the base for each transect and date
-            df = df.groupby(by=[transectsID, "date"], as_index=False).agg(
-                {"distance_from_base": "min"}).sort_values([transectsID, "date"])
+        # Side table with the sufficient statistics of each transect (only used to update the metrics incrementally)
+        statsTable = None
+        if mode != "Full":
+            statsTable = self._statistics_table(transectsFeature)
+            if statsTable is None:
+                arcpy.AddWarning("The incremental analysis needs the transects in a geodatabase: all the transects are refitted.")
+
+        # Try to update the statistics stored by the previous run with the new points only
+        incremental = None
+        if statsTable:
+            incremental = self._update_statistics(shoreFeatures, statsTable, transectsID)
+            if incremental is None:
+                arcpy.AddMessage("The statistics of the previous run cannot be updated: all the transects are refitted.")
+
+        updatedOnly = mode == "Incremental" and incremental is not None
+        if updatedOnly:
+            statistics, lastOID, pointsCount = incremental
+            shore_metrics = metrics_from_statistics(statistics, transectsID)
+            if robust:
+                arcpy.AddWarning("The robust rates need all the points, so they are only updated when the transects are refitted.")
         else:
-            # Sort the DataFrame by transect ID and date (to ensure the correct order of the data)
-            df = df.sort_values([transectsID, "date"])
-
-        # Perform the Linear Regression Analysis on each transect
-        # Each transect is fitted only once via compute_all_metrics()
-        metrics_list = []
-        for transect_id in sorted(df[transectsID].unique()):
-            metrics = ShorelineEvolution(df=df, transect_id=transect_id).compute_all_metrics()
-            metrics[transectsID] = transect_id
-            metrics_list.append(metrics)
-
-        shore_metrics = pd.DataFrame(metrics_list)
-        # Reorder columns: transect_id first
-        cols = [transectsID] + [c for c in shore_metrics.columns if c != transectsID]
-        shore_metrics = shore_metrics[cols]
+            # Fit all the transects from scratch (and store their statistics for the next incremental runs)
+            shore_metrics, partition = self._fit_all_transects(shoreFeatures, transectsID, engine, workers)
+            if statsTable:
+                statistics = update_sufficient_statistics(pd.DataFrame(), partition, transectsID)
+                lastOID, pointsCount = self._points_state(shoreFeatures)
+            if mode == "Verify" and incremental is not None:
+                self._verify_statistics(metrics_from_statistics(incremental[0], transectsID), shore_metrics, transectsID)
+            if robust:
+                # Robust rates (Theil-Sen and Huber) next to the LRR
+                robust_metrics = pd.concat([theil_sen_batched(partition), robust_irls_batched(partition)], axis=1)
+                robust_metrics[transectsID] = partition.transect_ids
+                shore_metrics = shore_metrics.merge(robust_metrics, on=transectsID, how="left")
+        if statsTable:
+            self._write_statistics(statsTable, statistics, shoreFeatures, lastOID, pointsCount, transectsID)
         
         # Add the metrics to the Transects Feature Class
         metrics_fields = shore_metrics.columns[1::].tolist() # Exclude the transect ID
         # Create the new fields in the Transects Feature Class
         create_new_fields(transectsFeature, metrics_fields, ['DOUBLE'] * len(metrics_fields))
 
+        # Metrics of each transect by transect ID
+        metrics_by_id = dict(zip(shore_metrics[transectsID].tolist(),
+                                 shore_metrics[metrics_fields].itertuples(index=False, name=None)))
         # Update the Transects Feature Class with the metrics
         with arcpy.da.UpdateCursor(transectsFeature, ["transect_id"] + metrics_fields) as cursor:
-            for i, _ in enumerate(cursor):
-                # Check if the transect ID is in the DataFrame (to handle the case where a transect has no intersections)
-                if cursor[0] in shore_metrics[transectsID].values:
-                    # Update the row with the metrics
-                    cursor.updateRow([cursor[0]] + shore_metrics.loc[i, metrics_fields].tolist())                   
-                else:
-                    # Update the row with NaN values
-                    cursor.updateRow([cursor[0]] + [np.nan] * len(metrics_fields))
-
-        # Export the output CSVs
-        self._export_output_data(shoreFeatures, transectsID, shore_metrics)
+            for row in cursor:
+                # Transects without intersections are updated with NaN values
+                cursor.updateRow([row[0]] + list(metrics_by_id.get(row[0], [np.nan] * len(metrics_fields))))
+
+        # Export the output CSVs (in Incremental mode, only the metrics, so the previous points are not read)
+        self._export_output_data(shoreFeatures, transectsID, shore_metrics, export_points=not updatedOnly)
         arcpy.AddMessage("The analysis has been successfully performed.\nPlease check the output data in the 'Output data' folder.")
+        arcpy.AddMessage(f"Dataset cache: {DATASET_CACHE.stats()}")
         
         return
 
@@ -180,7 +236,219 @@ class PerformAnalysis(object):
         
         return
 
-    def _export_output_data(self, shoreFeatures, transectsID, shore_metrics):
+    def _fit_all_transects(self, shoreFeatures, transectsID, engine, workers):
+        """
+        Private method to fit all the transects from scratch.
+
+        Parameters:
+            shoreFeatures (str): Name of Shoreline Intersection Points Feature Class.
+            transectsID (str): Name of ID field of Transects Feature Class.
+            engine (str): Regression engine ("Batched" or "Per transect").
+            workers (int): Number of worker processes of the per transect engine.
+
+        Returns:
+            pd.DataFrame: Metrics of each transect.
+            TransectPartition: Points of each transect (sorted by date).
+        """
+        # Get the data from the Shoreline Intersection Points Feature Class (as a DataFrame)
+        df = load_attributes(shoreFeatures, [transectsID, "date", "distance_from_base"])
+        
+        # For the multiple intersections, keep only the point closest to the baseline for each transect and date.
+        # The intersection tool already keeps one point per transect and shoreline (see its Multiple Intersections
+        # option), so this is only needed for several shorelines with the same date or points computed with "All".
+        if df[[transectsID, "date"]].duplicated(keep=False).sum() != 0: # If there are multiple intersections
+            # Keep only the point closest to the baseline for each transect and date
+            df = closest_to_baseline(df, transectsID).sort_values([transectsID, "date"])
+        else:
+            # Sort the DataFrame by transect ID and date (to ensure the correct order of the data)
+            df = df.sort_values([transectsID, "date"])
+
+        # Sort the data by transect and date and parse the dates only once
+        partition = TransectPartition(df, transectsID)
+
+        # Perform the Linear Regression Analysis on each transect
+        if engine == "Batched":
+            # All the transects at once with the closed-form OLS estimates (see compute_metrics_batched)
+            shore_metrics = compute_metrics_batched(partition, transectsID)
+        elif workers > 1 and len(partition) > 1:
+            # Chunks of transects in a process pool (the workers receive only the NumPy slices of their chunk)
+            arcpy.AddMessage(f"Analysing {len(partition)} transects with {workers} workers...")
+            with get_process_pool(workers) as pool:
+                shore_metrics = compute_metrics_parallel(partition, pool, workers, transectsID)
+        else:
+            # Each transect is fitted only once via compute_all_metrics(), on its slice of the partition (no copies)
+            shore_metrics = pd.DataFrame(compute_metrics_chunk(partition, transectsID))
+
+        return shore_metrics, partition
+
+    def _statistics_table(self, transectsFeature):
+        """
+        Private method to get the path of the table with the statistics of each transect. It is stored in the root of
+        the geodatabase of the transects (tables cannot be created inside a feature dataset).
+
+        Parameters:
+            transectsFeature (str): Name of Transects Feature Class.
+
+        Returns:
+            str: Path to the table (None if the transects are not stored in a geodatabase, e.g. a shapefile).
+        """
+        desc = arcpy.Describe(transectsFeature)
+        gdb_path = get_geodatabase_path(desc.catalogPath)
+        if os.path.splitext(gdb_path)[1].lower() not in ('.gdb', '.sde'):
+            return None
+        return os.path.join(gdb_path, desc.baseName + "_stats")
+
+    def _points_id(self, shoreFeatures):
+        """
+        Private method to get the creation ID of the Shoreline Intersection Points Feature Class (written by
+        Compute Intersections in every point, and kept when new shorelines are appended).
+
+        Parameters:
+            shoreFeatures (str): Name of Shoreline Intersection Points Feature Class.
+
+        Returns:
+            str: Creation ID (None if the points do not have one, e.g. computed by an older version of the tool).
+        """
+        if "creation_id" not in [f.name for f in arcpy.ListFields(shoreFeatures)]:
+            return None
+        with arcpy.da.SearchCursor(shoreFeatures, ["creation_id"]) as cursor:
+            for row in cursor:
+                return row[0]
+        return None
+
+    def _points_state(self, shoreFeatures):
+        """
+        Private method to get the last ObjectID and the number of points of the Shoreline Intersection Points Feature Class.
+
+        Parameters:
+            shoreFeatures (str): Name of Shoreline Intersection Points Feature Class.
+
+        Returns:
+            int: Last ObjectID (0 if there are no points).
+            int: Number of points.
+        """
+        with arcpy.da.SearchCursor(shoreFeatures, ["OID@"]) as cursor:
+            oids = [row[0] for row in cursor]
+        return max(oids, default=0), len(oids)
+
+    def _update_statistics(self, shoreFeatures, statsTable, transectsID):
+        """
+        Private method to update the statistics stored by the previous run with the points added since then
+        (ObjectID greater than the last one processed), without reading the previous points.
+
+        Parameters:
+            shoreFeatures (str): Name of Shoreline Intersection Points Feature Class.
+            statsTable (str): Path to the table with the statistics of each transect.
+            transectsID (str): Name of ID field of Transects Feature Class.
+
+        Returns:
+            tuple: Updated statistics (pd.DataFrame), last ObjectID and number of points (None if the statistics
+                   do not exist, belong to other points (or to a previous version of the feature class), points were
+                   deleted or a new point is not later than the last one of its transect).
+        """
+        if not arcpy.Exists(statsTable):
+            return None
+        fields = [transectsID] + STATISTICS_FIELDS + ["points_source", "points_id", "last_oid", "points_count"]
+        if any(field not in [f.name for f in arcpy.ListFields(statsTable)] for field in fields):
+            return None
+        with arcpy.da.SearchCursor(statsTable, fields) as cursor:
+            stored = pd.DataFrame([row for row in cursor], columns=fields)
+
+        # The statistics must have been computed from the same points: same path and same feature class (it gets
+        # a new creation ID when Compute Intersections recreates it, and its ObjectIDs start again from 1)
+        pointsId = self._points_id(shoreFeatures)
+        if (len(stored) == 0 or pointsId is None or set(stored["points_id"]) != {pointsId}
+                or set(stored["points_source"]) != {arcpy.Describe(shoreFeatures).catalogPath}):
+            return None
+        lastOID, pointsCount = int(stored["last_oid"].iloc[0]), int(stored["points_count"].iloc[0])
+        # Nulls are read as None, so the numeric fields are converted back to NaN
+        for field in STATISTICS_FIELDS:
+            if field not in ["first_date", "last_date"]:
+                stored[field] = pd.to_numeric(stored[field])
+
+        # Read only the new points
+        oidField = arcpy.Describe(shoreFeatures).OIDFieldName
+        with arcpy.da.SearchCursor(shoreFeatures, ["OID@", transectsID, "date", "distance_from_base"],
+                                   where_clause=f"{oidField} > {lastOID}") as cursor:
+            new = pd.DataFrame([row for row in cursor], columns=["oid", transectsID, "date", "distance_from_base"])
+
+        # Points deleted (or replaced) since the previous run cannot be removed from the statistics
+        if pointsCount + len(new) != int(arcpy.management.GetCount(shoreFeatures).getOutput(0)):
+            return None
+        if len(new):
+            lastOID = int(new["oid"].max())
+        # Multiple intersections of the new points (closest to the baseline, as in the full analysis)
+        new = closest_to_baseline(new, transectsID)
+
+        statistics = update_sufficient_statistics(stored[[transectsID] + STATISTICS_FIELDS], TransectPartition(new, transectsID),
+                                                  transectsID)
+        if statistics is None:
+            return None
+        arcpy.AddMessage(f"Statistics updated with {len(new)} new points.")
+        return statistics, lastOID, pointsCount + len(new)
+
+    def _write_statistics(self, statsTable, statistics, shoreFeatures, lastOID, pointsCount, transectsID):
+        """
+        Private method to (re)write the table with the statistics of each transect.
+
+        Parameters:
+            statsTable (str): Path to the table with the statistics of each transect.
+            statistics (pd.DataFrame): Statistics of each transect (see update_sufficient_statistics).
+            shoreFeatures (str): Name of Shoreline Intersection Points Feature Class.
+            lastOID (int): Last ObjectID of the points included in the statistics.
+            pointsCount (int): Number of points included in the statistics.
+            transectsID (str): Name of ID field of Transects Feature Class.
+
+        Returns:
+            None
+        """
+        if arcpy.Exists(statsTable):
+            arcpy.Delete_management(statsTable)
+        arcpy.management.CreateTable(os.path.dirname(statsTable), os.path.basename(statsTable))
+        date_fields = ["first_date", "last_date"]
+        arcpy.management.AddFields(statsTable,
+                                   [[transectsID, "LONG"], ["n", "LONG"]]
+                                   + [[field, "DATE" if field in date_fields else "DOUBLE"] for field in STATISTICS_FIELDS[1:]]
+                                   + [["points_source", "TEXT", "", 512], ["points_id", "TEXT", "", 32],
+                                      ["last_oid", "LONG"], ["points_count", "LONG"]])
+
+        source, pointsId = arcpy.Describe(shoreFeatures).catalogPath, self._points_id(shoreFeatures)
+        values = statistics[[transectsID] + STATISTICS_FIELDS].astype(object)
+        for field in date_fields:
+            values[field] = pd.to_datetime(statistics[field]).dt.to_pydatetime()
+        with arcpy.da.InsertCursor(statsTable, [transectsID] + STATISTICS_FIELDS
+                                   + ["points_source", "points_id", "last_oid", "points_count"]) as cursor:
+            for row in values.itertuples(index=False, name=None):
+                # Missing values (NaN) are stored as nulls
+                row = tuple(None if isinstance(v, float) and np.isnan(v) else v for v in row)
+                cursor.insertRow(row + (source, pointsId, lastOID, pointsCount))
+
+    def _verify_statistics(self, incremental_metrics, refit_metrics, transectsID, tolerance=1e-6):
+        """
+        Private method to compare the metrics updated from the stored statistics with a full refit.
+
+        Parameters:
+            incremental_metrics (pd.DataFrame): Metrics computed from the updated statistics.
+            refit_metrics (pd.DataFrame): Metrics of the full refit.
+            transectsID (str): Name of ID field of Transects Feature Class.
+            tolerance (float): Maximum relative difference allowed.
+
+        Returns:
+            None
+        """
+        merged = refit_metrics.merge(incremental_metrics, on=transectsID, how="outer", suffixes=("", "_inc"))
+        for metric in [c for c in refit_metrics.columns if c != transectsID]:
+            refit, inc = merged[metric].values.astype(float), merged[metric + "_inc"].values.astype(float)
+            difference = np.abs(refit - inc) / np.maximum(1, np.abs(refit))
+            mismatch = (difference > tolerance) | (np.isnan(refit) != np.isnan(inc))
+            max_difference = np.nanmax(difference) if np.any(~np.isnan(difference)) else 0
+            message = f"Verify {metric}: maximum relative difference {max_difference:.2e}, {int(mismatch.sum())} transects out of tolerance"
+            if mismatch.any():
+                arcpy.AddWarning(message)
+            else:
+                arcpy.AddMessage(message)
+
+    def _export_output_data(self, shoreFeatures, transectsID, shore_metrics, export_points=True):
         """
         Private method to export the output data.
 
@@ -188,14 +456,11 @@ class PerformAnalysis(object):
             shoreFeatures (str): Name of Shoreline Intersection Points Feature Class.
             transectsID (str): Name of ID field of Transects Feature Class.
             shore_metrics (pd.DataFrame): DataFrame where the metrics of the analysis are stored.
+            export_points (bool): Whether to export the distances of all the points (False to export only the metrics).
 
         Returns:
             None
         """
-        # Extract the values of the feature class by arcpy cursor
-        cursor = arcpy.da.SearchCursor(shoreFeatures, [transectsID, "date", "distance_from_base"])
-        shoreFeatures_df = pd.DataFrame(data=[row for row in cursor], columns=[transectsID, "date", "distance_from_base"])
-
         # Set the directory where XLSX will be stored
         aprx = arcpy.mp.ArcGISProject('CURRENT')
         out_dir = os.path.join(aprx.homeFolder, 'Output data')
@@ -203,7 +468,10 @@ class PerformAnalysis(object):
             os.mkdir(out_dir)
         
         # Export the shorelines intersections to a XLSX file
-        shoreFeatures_df.to_excel(os.path.join(out_dir, 'shorelines_distances.xlsx'), index=False)
+        if export_points:
+            # Extract the values of the feature class (already read by the analysis, so it comes from the session cache)
+            shoreFeatures_df = load_attributes(shoreFeatures, [transectsID, "date", "distance_from_base"])
+            shoreFeatures_df.to_excel(os.path.join(out_dir, 'shorelines_distances.xlsx'), index=False)
 
         # Export the metrics of the Linear Regression Fit to a XLSX file
         shore_metrics.to_excel(os.path.join(out_dir, 'analysis_metrics_transects.xlsx'), index=False)
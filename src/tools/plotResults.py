@@ -1,5 +1,7 @@
 import arcpy
 from tools.utils.plot_results import PlottingUtils
+from tools.utils.generic_funs import load_attributes
+from tools.utils.geometry_cache import DATASET_CACHE
 
 class PlotResults(object):
     def __init__(self):
@@ -109,6 +111,7 @@ class PlotResults(object):
             arcpy.AddError(f"An error occurred while plotting the spatiotemporal chart: {e}")
             
         arcpy.AddMessage("The analysis results have been plotted successfully.\nPlease, check the 'Plots results' folder.")
+        arcpy.AddMessage(f"Dataset cache: {DATASET_CACHE.stats()}")
 
         # Add a bar chart to the transects layer displaying the LRR values.
         aprx = arcpy.mp.ArcGISProject("CURRENT")
@@ -159,7 +162,7 @@ class PlotResults(object):
             raise Exception('Please, select more than one transect to plot.')
         """
         # Check for ID out of range
-        list_transect_id = [row[0] for row in arcpy.da.SearchCursor(transectsFeature, ['transect_id'])]
+        list_transect_id = load_attributes(transectsFeature, ['transect_id'])['transect_id'].tolist()
         if set(transectsID_2plot) - set(list_transect_id):
             arcpy.AddError('Invalid transect ID, check that all IDs are within the valid range.')
             raise Exception('Invalid transect ID, check that all IDs are within the valid range.')
@@ -1,6 +1,12 @@
 import arcpy
 import os
-from shapely.geometry import LineString, MultiLineString
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import shapely
+from tools.utils.geometry_cache import DATASET_CACHE
 
 """
 This file contains generic functions that are used in multiple scripts. The aim is to avoid code repetition.
@@ -47,10 +53,189 @@ def create_new_fields(input_fc, fields_to_add, data_type):
                                       field_name=field,
                                       field_type=data_type[i])
 
+# Field types returned by arcpy.ListFields and their equivalent in arcpy.management.AddField
+FIELD_TYPES = {"SmallInteger": "SHORT", "Integer": "LONG", "BigInteger": "BIGINTEGER", "Single": "FLOAT",
+               "Double": "DOUBLE", "String": "TEXT", "Date": "DATE", "DateOnly": "DATEONLY",
+               "TimeOnly": "TIMEONLY", "TimestampOffset": "TIMESTAMPOFFSET", "GUID": "GUID"}
+
+# Function to copy the definition of some fields to another feature class
+def add_fields_like(input_fc, fields):
+    """
+    This method adds to a feature class the fields with the same name, type and length as the given ones,
+    in a single geoprocessing call. Fields of unsupported types (e.g. geometry or raster) are ignored.
+    
+    Params:
+        - input_fc: Feature class where the fields will be added.
+        - fields: List of arcpy Field objects (e.g. from arcpy.ListFields of another feature class).
+    
+    Returns:
+        - None
+    """
+    field_description = [[field.name, FIELD_TYPES[field.type], field.aliasName, field.length]
+                         for field in fields if field.type in FIELD_TYPES]
+    if field_description:
+        arcpy.management.AddFields(input_fc, field_description)
+
+# Function to resolve the number of worker processes requested by the user
+def resolve_workers(workers):
+    """
+    This method resolves the number of worker processes to use.
+    
+    Params:
+        - workers: Number of workers requested (0 or None means all the available cores).
+    
+    Returns:
+        - Number of workers (at least 1).
+    """
+    if not workers or workers < 1:
+        return os.cpu_count() or 1
+    return int(workers)
+
+# Function to create a process pool that also works from inside ArcGIS Pro
+def get_process_pool(workers):
+    """
+    This method creates a process pool for the parallel modes of the tools.
+    Inside ArcGIS Pro, sys.executable points to ArcGISPro.exe, so the workers are launched
+    with the Python interpreter of the active environment instead.
+    
+    Params:
+        - workers: Number of worker processes.
+    
+    Returns:
+        - concurrent.futures.ProcessPoolExecutor object.
+    """
+    context = multiprocessing.get_context("spawn")
+    if not os.path.basename(sys.executable).lower().startswith("python"):
+        python_exe = os.path.join(sys.exec_prefix, "python.exe")
+        if os.path.exists(python_exe):
+            context.set_executable(python_exe)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+# Function to read the geometries of a feature class in bulk
+def load_geometries(feature, id=None):
+    """
+    This method reads the geometries of a feature class as WKB and decodes all of them in one call,
+    instead of iterating every vertex as an arcpy.Point.
+    ArcGIS encodes every polyline as a MultiLineString, so the single-part ones are returned as LineStrings.
+    The result is kept in the session cache (see geometry_cache), so the arrays are read-only.
+    
+    Params:
+        - feature: Path to the feature class.
+        - id: Name of the ID field (if None, the ObjectID is used).
+    
+    Returns:
+        - ids: NumPy array with the ID of each feature.
+        - geometries: NumPy array with the Shapely geometry of each feature (aligned with ids).
+    """
+    return DATASET_CACHE.get(feature, ("geometries", id), lambda: _read_geometries(feature, id))
+
+def _read_geometries(feature, id=None):
+    """
+    This method reads and decodes the geometries of a feature class (see load_geometries).
+    """
+    ids, wkb_list = [], []
+    with arcpy.da.SearchCursor(feature, [id if id else "OID@", "SHAPE@WKB"]) as cursor:
+        for row in cursor:
+            ids.append(row[0])
+            wkb_list.append(bytes(row[1]) if row[1] is not None else None)
+    
+    ids = np.array(ids)
+    geometries = _decode_wkb(wkb_list)
+    ids.flags.writeable = False
+    geometries.flags.writeable = False
+    return ids, geometries
+
+def _decode_wkb(wkb_list):
+    """
+    This method decodes a list of WKB geometries to a NumPy array of 2D Shapely geometries.
+    ArcGIS encodes every polyline as a MultiLineString, so the single-part ones are converted to LineStrings.
+    """
+    geometries = shapely.force_2d(shapely.from_wkb(np.array(wkb_list, dtype=object)))
+    # Convert the single-part MultiLineStrings to LineStrings
+    single_part = ((shapely.get_type_id(geometries) == shapely.GeometryType.MULTILINESTRING)
+                   & (shapely.get_num_geometries(geometries) == 1))
+    geometries[single_part] = shapely.get_geometry(geometries[single_part], 0)
+    return geometries
+
+# Function to read the geometries of a feature class in chunks
+def iter_geometries(feature, id=None, fields=(), chunk_size=10000):
+    """
+    This method reads the geometries of a feature class in chunks of rows, so only one chunk is
+    decoded and kept in memory at a time. Unlike load_geometries, the chunks are not cached.
+    
+    Params:
+        - feature: Path to the feature class.
+        - id: Name of the ID field (if None, the ObjectID is used).
+        - fields: Names of other fields read together with the geometries.
+        - chunk_size: Maximum number of rows of each chunk.
+    
+    Returns:
+        - Generator of (ids, geometries, rows) tuples, where ids and geometries are NumPy arrays (see load_geometries)
+          and rows is a list with the values of the other fields of each row.
+    """
+    fields = list(fields)
+    ids, wkb_list, rows = [], [], []
+    with arcpy.da.SearchCursor(feature, [id if id else "OID@", "SHAPE@WKB"] + fields) as cursor:
+        for row in cursor:
+            ids.append(row[0])
+            wkb_list.append(bytes(row[1]) if row[1] is not None else None)
+            rows.append(row[2:])
+            if len(ids) == chunk_size:
+                yield np.array(ids), _decode_wkb(wkb_list), rows
+                ids, wkb_list, rows = [], [], []
+    if ids:
+        yield np.array(ids), _decode_wkb(wkb_list), rows
+
+# Function to read the attributes of a feature class into a DataFrame
+def load_attributes(feature, fields):
+    """
+    This method reads the attribute table of a feature class into a Pandas DataFrame.
+    The table is kept in the session cache (see geometry_cache) and a copy is returned.
+    
+    Params:
+        - feature: Path to the feature class.
+        - fields: List of fields to read.
+    
+    Returns:
+        - Pandas DataFrame with one column per field.
+    """
+    fields = list(fields)
+    def _read_attributes():
+        with arcpy.da.SearchCursor(feature, fields) as cursor:
+            return pd.DataFrame(data=[row for row in cursor], columns=fields)
+    return DATASET_CACHE.get(feature, ("attributes", tuple(fields)), _read_attributes).copy()
+
+# Function to read the raw rows of a feature class
+def load_rows(feature, fields):
+    """
+    This method reads the rows of a feature class with the values as returned by the cursor, so they can be
+    written again with an InsertCursor (unlike load_attributes, null integers and dates stay None instead of
+    NaN/NaT). The rows are kept in the session cache (see geometry_cache), so the array is read-only.
+
+    Params:
+        - feature: Path to the feature class.
+        - fields: List of fields to read.
+
+    Returns:
+        - NumPy object array with one row per feature and one column per field.
+    """
+    fields = list(fields)
+    def _read_rows():
+        with arcpy.da.SearchCursor(feature, fields) as cursor:
+            values = [row for row in cursor]
+        # Filled row by row, so NumPy does not try to convert the values
+        rows = np.empty((len(values), len(fields)), dtype=object)
+        for i, row in enumerate(values):
+            rows[i] = row
+        rows.flags.writeable = False
+        return rows
+    return DATASET_CACHE.get(feature, ("rows", tuple(fields)), _read_rows)
+
 def line_arcgis2shapely(feature: str, id: str=None):
     """
     Converts an ArcGIS line feature to a Shapely LineString object.
     This method is used to convert the baseline and shoreline features to Shapely objects.
+    The geometries are read in bulk as WKB (see load_geometries).
     
     Parameters:
         feature (str): ArcGIS line feature
@@ -58,56 +243,23 @@ def line_arcgis2shapely(feature: str, id: str=None):
     Returns:
         feature_lines (list or dict): Shapely LineString objects
     """
+    ids, geometries = load_geometries(feature, id)
+    if id: # If the feature has an ID, return a dictionary. Otherwise, return a list.
+        return dict(zip(ids.tolist(), geometries))
+    return list(geometries)
+
+def point_arcgis2shapely(feature: str, id: str=None):
+    """
+    Converts an ArcGIS point feature to a Shapely Point object.
+    The geometries are read in bulk as WKB (see load_geometries).
+    
+    Parameters:
+        feature (str): ArcGIS point feature
+        id (str): ID of the feature
+    Returns:
+        feature_points (list or dict): Shapely Point objects
+    """
+    ids, geometries = load_geometries(feature, id)
     if id: # If the feature has an ID, return a dictionary. Otherwise, return a list.
-        # Define an empty dictionary to store the Shapely LineString objects
-        feature_lines = {} 
-        # Iterate over the features and convert them to Shapely LineString objects
-        with arcpy.da.SearchCursor(feature, [id, "SHAPE@"]) as cursor:
-            for row in cursor:
-                # Get the id of the row
-                row_id = row[0]
-                # Get the geometry (SHAPE@) of the row
-                geometry = row[1]
-                # Extract coordinates of geometry points
-                if len(geometry) == 1: # If the geometry is a single part
-                    # Extract the coordinates of the points in the geometry
-                    for part in geometry:
-                        # Create a Shapely LineString object
-                        feature_lines.update(
-                            {row_id: LineString([(point.X, point.Y) for point in part])}
-                        )
-                else: # If the geometry is multipart
-                    # Define a list to store the lines of the geometry
-                    lines = []
-                    # Extract the coordinates of the points in the geometry
-                    for part in geometry:
-                        # Create a Shapely LineString object
-                        lines.append(LineString([(point.X, point.Y) for point in part]))
-                    # Create a Shapely MultiLineString object
-                    feature_lines.update(
-                        {row_id: MultiLineString(lines)}
-                    )
-    else: # If the feature does not have an ID
-        # Define an empty list to store the Shapely LineString objects
-        feature_lines = []
-        # Iterate over the features and convert them to Shapely LineString objects
-        with arcpy.da.SearchCursor(feature, ["SHAPE@"]) as cursor:
-            for row in cursor:
-                # Get the geometry (SHAPE@) of the row
-                geometry = row[0]
-                # Extract coordinates of geometry points
-                if len(geometry) == 1: # If the geometry is a single part
-                    for part in geometry:
-                        # Create a Shapely LineString object
-                        feature_lines.append(LineString([(point.X, point.Y) for point in part]))
-                else: # If the geometry is multipart
-                    # Define a list to store the lines of the geometry
-                    lines = []
-                    # Extract the coordinates of the points in the geometry
-                    for part in geometry:
-                        # Create a Shapely LineString object
-                        lines.append(LineString([(point.X, point.Y) for point in part]))
-                    # Create a Shapely MultiLineString object
-                    feature_lines.append(MultiLineString(lines))
-                    
-    return feature_lines
\ No newline at end of file
+        return dict(zip(ids.tolist(), geometries))
+    return list(geometries)
@@ -0,0 +1,181 @@
+import arcpy
+import glob
+import os
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import shapely
+
+"""
+This file contains a process-level cache of the geometries and attribute tables read from the feature classes.
+The tools of the toolbox run in the same Python process during an ArcGIS Pro session (or a batch run), so the
+datasets read by one tool (e.g. the transects in tools 2, 3 and 4) are decoded only once.
+The entries are keyed by the dataset path, the layer selection, the schema, the number of rows and the last
+modification time of the dataset files, so any edit of the dataset invalidates them. The least recently used
+entries are evicted when the memory budget is exceeded.
+"""
+
+# Default memory budget of the cache (in bytes)
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+class DatasetCache(object):
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Least-recently-used cache of decoded datasets with a memory budget.
+
+        Parameters:
+            max_bytes (int): Memory budget of the cache in bytes.
+
+        Returns:
+            None
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, size in bytes)
+        self._size = 0
+
+    def get(self, feature, kind, loader):
+        """
+        Returns the cached value of a dataset or loads it (and stores it) if it is not cached or out of date.
+
+        Parameters:
+            feature (str): Path to the feature class (or layer).
+            kind (tuple): Description of the value (e.g. ("geometries", id_field)).
+            loader (callable): Function without arguments that reads the value from the dataset.
+
+        Returns:
+            The cached or loaded value.
+        """
+        signature = dataset_signature(feature)
+        if signature is None:
+            # The modification time of the dataset is unknown (e.g. in_memory), so it cannot be cached
+            self.misses += 1
+            return loader()
+
+        key = (signature, kind)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        self.misses += 1
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        """
+        Stores a value and evicts the least recently used entries to keep the cache within its memory budget.
+        Values larger than the whole budget are not stored.
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def clear(self):
+        """Removes all the entries and resets the counters."""
+        self._entries.clear()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        Returns a summary of the usage of the cache.
+
+        Returns:
+            str: Number of hits, misses, entries and memory used.
+        """
+        return (f"{self.hits} hits, {self.misses} misses, {len(self._entries)} entries, "
+                f"{self._size / 1024 ** 2:.1f} MB of {self.max_bytes / 1024 ** 2:.0f} MB")
+
+
+def dataset_signature(feature):
+    """
+    Identifies the current state of a dataset: path, layer selection, schema, number of rows and
+    last modification time of its files.
+
+    Parameters:
+        feature (str): Path to the feature class (or layer).
+
+    Returns:
+        tuple: Signature of the dataset (None if its modification time cannot be determined).
+    """
+    desc = arcpy.Describe(feature)
+    path = desc.catalogPath
+    modified = _last_modified(path, getattr(desc, 'DSID', None))
+    if modified is None:
+        return None
+
+    # Selection and definition query of the layer (if any)
+    selection = (getattr(desc, 'FIDSet', '') or '', getattr(desc, 'whereClause', '') or '')
+    schema = tuple((f.name, f.type) for f in arcpy.ListFields(feature))
+    count = int(arcpy.management.GetCount(feature).getOutput(0))
+
+    return (path, selection, schema, count, modified)
+
+
+def _last_modified(path, dsid=None):
+    """
+    Gets the last modification time of the files of a dataset.
+    In a file geodatabase, the files of a table are named after its dataset ID (a<DSID in hex>.*).
+
+    Parameters:
+        path (str): Catalog path of the dataset.
+        dsid (int): Dataset ID (only used for file geodatabases).
+
+    Returns:
+        float: Last modification time (None if it cannot be determined).
+    """
+    # Find the file geodatabase that contains the dataset (it may be inside a feature dataset)
+    workspace = path
+    while workspace and not workspace.lower().endswith('.gdb'):
+        parent = os.path.dirname(workspace)
+        if parent == workspace:
+            workspace = None
+            break
+        workspace = parent
+
+    if workspace and dsid is not None:
+        files = glob.glob(os.path.join(workspace, f"a{int(dsid):08x}.*"))
+        return max(os.path.getmtime(f) for f in files) if files else None
+
+    # Datasets stored as files (e.g. shapefiles)
+    if os.path.isfile(path):
+        return os.path.getmtime(path)
+
+    return None
+
+
+def estimate_size(value):
+    """
+    Estimates the memory used by a cached value (arrays, Shapely geometries, DataFrames or tuples of them).
+
+    Parameters:
+        value: Cached value.
+
+    Returns:
+        int: Estimated size in bytes.
+    """
+    if isinstance(value, tuple):
+        return sum(estimate_size(v) for v in value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            # Shapely geometries: coordinates plus the overhead of each GEOS object
+            coordinates = shapely.get_num_coordinates(value[shapely.is_geometry(value)]).sum()
+            return int(value.nbytes + 16 * coordinates + 100 * len(value))
+        return int(value.nbytes)
+    return 0
+
+
+# Cache shared by all the tools of the toolbox in the current process
+DATASET_CACHE = DatasetCache()
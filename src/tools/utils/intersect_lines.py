@@ -1,12 +1,14 @@
-import arcpy
-from shapely.geometry import Point, LineString, MultiLineString
+from tools.utils import generic_funs
+from tools.utils.intersection_engine import (intersect_baseline_grouped, intersect_shorelines_indexed,
+                                              intersect_shorelines_analytic, intersect_shorelines_parallel)
 
 
 class IntersectLines():
     def __init__():
         """
         This class computes the intersection between both baseline and shorelines with transects.
-        The output will be a dictionary with the transect ID as key and the intersection point (Shapely object) as value.
+        The baseline points are returned as a dictionary with the transect ID as key and the intersection point (Shapely object)
+        as value, and the shoreline points as a structured NumPy array with one row per point.
         The class also contains two methods to convert line and point ArcGIS features to Shapely objects.
         
         Parameters:
@@ -17,6 +19,7 @@ class IntersectLines():
         """
         Converts an ArcGIS line feature to a Shapely LineString object.
         This method is used to convert the baseline and shoreline features to Shapely objects.
+        The geometries are read in bulk as WKB (see generic_funs.load_geometries).
         
         Parameters:
             feature (str): ArcGIS line feature
@@ -24,63 +27,12 @@ class IntersectLines():
         Returns:
             feature_lines (list or dict): Shapely LineString objects
         """
-        if id: # If the feature has an ID, return a dictionary. Otherwise, return a list.
-            # Define an empty dictionary to store the Shapely LineString objects
-            feature_lines = {} 
-            # Iterate over the features and convert them to Shapely LineString objects
-            with arcpy.da.SearchCursor(feature, [id, "SHAPE@"]) as cursor:
-                for row in cursor:
-                    # Get the id of the row
-                    row_id = row[0]
-                    # Get the geometry (SHAPE@) of the row
-                    geometry = row[1]
-                    # Extract coordinates of geometry points
-                    if len(geometry) == 1: # If the geometry is a single part
-                        # Extract the coordinates of the points in the geometry
-                        for part in geometry:
-                            # Create a Shapely LineString object
-                            feature_lines.update(
-                                {row_id: LineString([(point.X, point.Y) for point in part])}
-                            )
-                    else: # If the geometry is multipart
-                        # Define a list to store the lines of the geometry
-                        lines = []
-                        # Extract the coordinates of the points in the geometry
-                        for part in geometry:
-                            # Create a Shapely LineString object
-                            lines.append(LineString([(point.X, point.Y) for point in part]))
-                        # Create a Shapely MultiLineString object
-                        feature_lines.update(
-                            {row_id: MultiLineString(lines)}
-                        )
-        else: # If the feature does not have an ID
-            # Define an empty list to store the Shapely LineString objects
-            feature_lines = []
-            # Iterate over the features and convert them to Shapely LineString objects
-            with arcpy.da.SearchCursor(feature, ["SHAPE@"]) as cursor:
-                for row in cursor:
-                    # Get the geometry (SHAPE@) of the row
-                    geometry = row[0]
-                    # Extract coordinates of geometry points
-                    if len(geometry) == 1: # If the geometry is a single part
-                        for part in geometry:
-                            # Create a Shapely LineString object
-                            feature_lines.append(LineString([(point.X, point.Y) for point in part]))
-                    else: # If the geometry is multipart
-                        # Define a list to store the lines of the geometry
-                        lines = []
-                        # Extract the coordinates of the points in the geometry
-                        for part in geometry:
-                            # Create a Shapely LineString object
-                            lines.append(LineString([(point.X, point.Y) for point in part]))
-                        # Create a Shapely MultiLineString object
-                        feature_lines.append(MultiLineString(lines))
-                        
-        return feature_lines
+        return generic_funs.line_arcgis2shapely(feature, id)
 
     def point_arcgis2shapely(feature: str, id: str=None):
         """
         Converts an ArcGIS point feature to a Shapely Point object.
+        The geometries are read in bulk as WKB (see generic_funs.load_geometries).
         
         Parameters:
             feature (str): ArcGIS point feature
@@ -88,38 +40,13 @@ class IntersectLines():
         Returns:
             feature_points (dict): Shapely Point objects
         """
-        if id: # If the feature has an ID, return a dictionary. Otherwise, return a list.
-            # Define an empty dictionary to store the Shapely Point objects
-            feature_points = {}
-            # Iterate over the features and convert them to Shapely Point objects
-            with arcpy.da.SearchCursor(feature, [id, "SHAPE@"]) as cursor:
-                for row in cursor:
-                    # Get the id of the row
-                    row_id = row[0]
-                    # Get the geometry (SHAPE@) of the row
-                    geometry = row[1]
-                    # Create a Shapely point object
-                    feature_points.update(
-                        {row_id: Point([(geom.X, geom.Y) for geom in geometry][0])}
-                    )
-        else: # If the feature does not have an ID
-            # Define an empty list to store the Shapely Point objects
-            feature_points = []
-            # Iterate over the features and convert them to Shapely Point objects
-            with arcpy.da.SearchCursor(feature, ["SHAPE@"]) as cursor:
-                for row in cursor:
-                    # Get the geometry (SHAPE@) of the row
-                    geometry = row[0]
-                    # Create a Shapely point object
-                    feature_points.append(Point([(geom.X, geom.Y) for geom in geometry][0])
-                    )
-        
-        return feature_points
+        return generic_funs.point_arcgis2shapely(feature, id)
     
     def intersect_baseline(transects_feature, baseline_feature, has_multiple_features=False, transect_baseline_map=None):
         """
         This method computes the intersection between the baseline and transects.
         The output is a dictionary with the transect ID as key and the intersection point as value.
+        The transects are grouped by baseline and intersected in batches (see intersection_engine).
         
         Parameters:
             transects_feature (dict): Shapely LineString objects with transect_id as key
@@ -130,86 +57,40 @@ class IntersectLines():
         Returns:
             base_points (dict): Shapely Point objects
         """
-        # Define an empty dictionary to store the intersection points
-        base_points = {}
-        
         if has_multiple_features and transect_baseline_map:
             # Multiple baseline segments - match each transect with its corresponding baseline
-            for id_transect, line_transect in transects_feature.items():
-                baseline_id = transect_baseline_map.get(id_transect)
-                if baseline_id and baseline_id in baseline_feature:
-                    # Compute intersection with the corresponding baseline segment
-                    intersection = line_transect.intersection(baseline_feature[baseline_id])
-                    if not intersection.is_empty:
-                        # Handle MultiPoint by taking the first point
-                        if intersection.geom_type == 'MultiPoint':
-                            base_points[id_transect] = list(intersection.geoms)[0]
-                        elif intersection.geom_type == 'Point':
-                            base_points[id_transect] = intersection
-        else:
-            # Single baseline segment - original logic
-            baseline_geom = baseline_feature[0] if isinstance(baseline_feature, list) else baseline_feature
-            for id_transect, line_transect in transects_feature.items():
-                # Compute the intersection between the transect and the baseline
-                intersection = line_transect.intersection(baseline_geom)
-                if not intersection.is_empty:
-                    # Handle MultiPoint by taking the first point
-                    if intersection.geom_type == 'MultiPoint':
-                        base_points[id_transect] = list(intersection.geoms)[0]
-                    elif intersection.geom_type == 'Point':
-                        base_points[id_transect] = intersection
-
-        return base_points
+            return intersect_baseline_grouped(transects_feature, baseline_feature, transect_baseline_map)
+        
+        # Single baseline segment
+        baseline_geom = baseline_feature[0] if isinstance(baseline_feature, list) else baseline_feature
+        return intersect_baseline_grouped(transects_feature, baseline_geom)
     
-    def intersect_shorelines(transects_feature, shorelines_feature):
+    def intersect_shorelines(transects_feature, shorelines_feature, engine="GEOS", pool=None, workers=1,
+                             transect_specs=None):
         """
         This method computes the intersection between the shorelines and transects.
-        The output is a dictionary with the transect ID and shoreline ID as key and the intersection point as value.
+        The output is a structured NumPy array with one row per intersection point and the columns
+        transect_id, shore_id, x, y, t_along and part_index (see intersection_engine.INTERSECTION_DTYPE).
+        Two engines are available (see intersection_engine):
+            - "GEOS": the shoreline parts are indexed in an STRtree, so only the candidate pairs are intersected.
+            - "Analytic": the two-point transects are intersected with the shoreline segments in parametric form.
+        If a process pool is given, blocks of shorelines are intersected in parallel (same output as a serial run).
+        The transects can be shared with the workers once for several calls (see intersection_engine.shared_transects).
         
         Parameters:
-            transects_feature (dict): Shapely LineString objects
+            transects_feature (dict or TransectIndex): Shapely LineString objects (or their prebuilt spatial index)
             shorelines_feature (dict): Shapely LineString objects
+            engine (str): Intersection engine ("GEOS" or "Analytic")
+            pool (concurrent.futures.Executor): Process pool (None to run in the current process)
+            workers (int): Number of worker processes of the pool
+            transect_specs (dict): Transects already shared with the workers (None to share them in this call)
             
         Returns:
-            shore_points (dict): Shapely Point objects
+            shore_points (np.ndarray): Structured array with the intersection points
         """
-        # Define an empty dictionary to store the intersection points
-        shore_points = {}
-        # Iterate over the transects and compute the intersection with the shorelines
-        for id_transect, line_transect in transects_feature.items():
-            # Iterate over the shorelines and compute the intersection with the transects
-            for id_shore, line_shore in shorelines_feature.items():
-                if isinstance(line_shore, MultiLineString): # If the shoreline is a MultiLineString
-                    # Iterate over the parts of the MultiLineString
-                    for part in list(line_shore.geoms):
-                        # Compute the intersection between the transect and the shoreline part
-                        intersection = line_transect.intersection(part)
-                        if not intersection.is_empty: # If the intersection is not empty
-                            # If the intersection is a MultiPoint, break it down into its components
-                            if intersection.geom_type == 'MultiPoint':
-                                # Store the intersection points in the dictionary
-                                shore_points.update(
-                                    {(id_transect, id_shore): list(intersection.geoms)}
-                                )
-                            else:
-                                # Store the intersection point in the dictionary
-                                shore_points.update(
-                                    {(id_transect, id_shore): intersection}
-                                )
-                else: # If the shoreline is a LineString
-                    # Compute the intersection between the transect and the shoreline
-                    intersection = line_transect.intersection(line_shore)
-                    if not intersection.is_empty: # If the intersection is not empty
-                        # If the intersection is a MultiPoint, break it down into its components
-                        if intersection.geom_type == 'MultiPoint':
-                            # Store the intersection points in the dictionary
-                            shore_points.update(
-                                {(id_transect, id_shore): list(intersection.geoms)}
-                            )
-                        else:
-                            # Store the intersection point in the dictionary
-                            shore_points.update(
-                                {(id_transect, id_shore): intersection}
-                            )
-
-        return shore_points
\ No newline at end of file
+        if pool is not None and workers > 1:
+            return intersect_shorelines_parallel(transects_feature, shorelines_feature, pool, workers, engine=engine,
+                                                 transect_specs=transect_specs)
+        if engine == "Analytic":
+            return intersect_shorelines_analytic(transects_feature, shorelines_feature)
+        return intersect_shorelines_indexed(transects_feature, shorelines_feature)
@@ -0,0 +1,608 @@
+import hashlib
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+import shapely
+from tools.utils.transect_engine import segment_intersections
+
+"""
+This file contains the engines used by the IntersectLines class to intersect the transects with the shorelines.
+It does not depend on arcpy, so it can also be used (and benchmarked) outside ArcGIS Pro.
+The baseline intersection is computed in batches (one vectorized call per baseline).
+Two engines are available for the shorelines:
+    - GEOS: the shoreline parts are queried against an STRtree of the transects and the candidate pairs are
+      intersected by Shapely.
+    - Analytic: each transect is treated as a two-point segment and intersected with all the candidate
+      shoreline segments at once in parametric form with NumPy.
+Both engines accept a prebuilt TransectIndex, so the shorelines can be intersected chunk by chunk, and can run
+in a process pool (intersect_shorelines_parallel), with the coordinates shared with the workers through shared memory.
+All of them return the intersection points as a structured NumPy array (see INTERSECTION_DTYPE).
+"""
+
+# Structured array with one row per intersection point of the shorelines with the transects (output of all the engines):
+#   - transect_id, shore_id: IDs of the transect and the shoreline.
+#   - x, y: coordinates of the point.
+#   - t_along: position along the transect (0 at the start, 1 at the end).
+#   - part_index: position of the intersected part within the shoreline (0 for single-part shorelines).
+INTERSECTION_DTYPE = np.dtype([('transect_id', '<i8'), ('shore_id', '<i8'), ('x', '<f8'), ('y', '<f8'),
+                               ('t_along', '<f8'), ('part_index', '<i4')])
+
+
+def intersection_fingerprint(transects_feature, baseline_feature, *params):
+    """
+    Computes a fingerprint of the inputs that determine the intersection points of a shoreline with the
+    transects: the transects, the baseline(s) and the intersection parameters. If it does not change, the
+    points already computed for a shoreline are still valid.
+
+    Parameters:
+        transects_feature (dict): Shapely LineString objects with the transect ID as key.
+        baseline_feature (list or dict): Shapely LineString object(s) of the baseline.
+        *params: Other parameters of the intersection (engine, transect/baseline mapping, ...).
+
+    Returns:
+        str: Hexadecimal SHA-1 digest (40 characters).
+    """
+    digest = hashlib.sha1()
+    for feature in (transects_feature, baseline_feature):
+        items = feature.items() if isinstance(feature, dict) else enumerate(feature)
+        for key, geom in items:
+            digest.update(repr(key).encode())
+            digest.update(shapely.to_wkb(geom))
+    digest.update(repr(params).encode())
+    return digest.hexdigest()
+
+
+def intersect_baseline_grouped(transects_feature, baseline_feature, transect_baseline_map=None):
+    """
+    Computes the intersection between the baseline(s) and the transects in batches.
+    Each baseline is prepared once and intersected with all its transects in a single vectorized call.
+    The output is the same as the per-transect loop: for each transect the intersection Point, or the first
+    point of a MultiPoint. Other intersections (e.g. collinear overlaps) and empty ones are ignored.
+
+    Parameters:
+        transects_feature (dict): Shapely LineString objects with the transect ID as key.
+        baseline_feature (shapely geometry or dict): Baseline geometry, or geometries with the baseline ID as key.
+        transect_baseline_map (dict): Baseline ID of each transect ID (only if baseline_feature is a dict).
+
+    Returns:
+        base_points (dict): Shapely Point objects with the transect ID as key.
+    """
+    base_points = {}
+    transect_ids = np.array(list(transects_feature.keys()))
+    transect_geoms = np.array(list(transects_feature.values()), dtype=object)
+    if len(transect_geoms) == 0:
+        return base_points
+
+    # Group the transects by their baseline (a single group if there is only one baseline)
+    if transect_baseline_map is None:
+        groups = [(baseline_feature, np.arange(len(transect_geoms)))]
+    else:
+        baseline_ids = [transect_baseline_map.get(id_transect) for id_transect in transect_ids.tolist()]
+        positions = {}
+        for i, baseline_id in enumerate(baseline_ids):
+            # Transects without a (valid) baseline ID are skipped, as in the per-transect loop
+            if baseline_id and baseline_id in baseline_feature:
+                positions.setdefault(baseline_id, []).append(i)
+        groups = [(baseline_feature[baseline_id], np.array(idx)) for baseline_id, idx in positions.items()]
+
+    for baseline_geom, idx in groups:
+        # Preparing the baseline speeds up the repeated intersections with its transects
+        shapely.prepare(baseline_geom)
+        intersections = shapely.intersection(transect_geoms[idx], baseline_geom)
+        type_id = shapely.get_type_id(intersections)
+        is_multipoint = type_id == shapely.GeometryType.MULTIPOINT
+        # Take the first point of the MultiPoints
+        intersections[is_multipoint] = shapely.get_geometry(intersections[is_multipoint], 0)
+        valid = (is_multipoint | (type_id == shapely.GeometryType.POINT)) & ~shapely.is_empty(intersections)
+        base_points.update(zip(transect_ids[idx[valid]].tolist(), intersections[valid]))
+
+    # Keep the order of the transects
+    return {id_transect: base_points[id_transect] for id_transect in transects_feature if id_transect in base_points}
+
+
+def explode_shorelines(shorelines_feature):
+    """
+    Splits the shorelines into their parts (a LineString is its own single part).
+
+    Parameters:
+        shorelines_feature (dict or tuple): Shapely LineString/MultiLineString objects with the shoreline ID as key
+                                            (or a tuple already split in parts, as returned by this function).
+
+    Returns:
+        shore_ids (list): IDs of the shorelines, in the order of the dictionary.
+        parts (np.ndarray): Shapely LineString objects of all the parts, grouped by shoreline.
+        part_shore (np.ndarray): Position (in shore_ids) of the shoreline of each part.
+    """
+    if isinstance(shorelines_feature, tuple):
+        return shorelines_feature
+    shore_ids = list(shorelines_feature.keys())
+    shore_geoms = np.array(list(shorelines_feature.values()), dtype=object)
+    if len(shore_geoms) == 0:
+        return shore_ids, np.empty(0, dtype=object), np.empty(0, dtype=np.intp)
+    parts, part_shore = shapely.get_parts(shore_geoms, return_index=True)
+    return shore_ids, parts, part_shore
+
+
+class TransectIndex(object):
+    def __init__(self, transects_feature):
+        """
+        Spatial index of the transects. It is built once and reused to intersect the shorelines, so they
+        can be processed in chunks (streaming) without indexing the transects again for every chunk.
+
+        Parameters:
+            transects_feature (dict): Shapely LineString objects with the transect ID as key.
+
+        Returns:
+            None
+        """
+        self.ids = np.array(list(transects_feature.keys()))
+        self.geoms = np.array(list(transects_feature.values()), dtype=object)
+        self.tree = shapely.STRtree(self.geoms)
+        # First and last vertex of each transect (used by the analytic engine)
+        if len(self.geoms):
+            self.start, self.end = transect_endpoints(self.geoms)
+        else:
+            self.start, self.end = np.empty((0, 2)), np.empty((0, 2))
+        # Unit vector of each transect (from its landward start to its seaward end)
+        direction = self.end - self.start
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.unit = direction / np.hypot(direction[:, 0], direction[:, 1])[:, None]
+        self._sorter = np.argsort(self.ids, kind='stable')
+
+    def __len__(self):
+        return len(self.geoms)
+
+    def positions(self, transect_ids):
+        """
+        Gets the position in the index of some transects.
+
+        Parameters:
+            transect_ids (np.ndarray): IDs of the transects (they must be in the index).
+
+        Returns:
+            np.ndarray: Position of each transect.
+        """
+        return self._sorter[np.searchsorted(self.ids, transect_ids, sorter=self._sorter)]
+
+
+def _as_transect_index(transects_feature):
+    """Returns the TransectIndex of the transects (built if a dictionary is given)."""
+    if isinstance(transects_feature, TransectIndex):
+        return transects_feature
+    return TransectIndex(transects_feature)
+
+
+def _collect_hits(index, shore_ids, part_shore, transect_idx, part_idx, xy, t):
+    """
+    Builds the structured array of intersection points (see INTERSECTION_DTYPE) from the hits of an engine.
+    The hits are sorted by transect, shoreline, part and position along the transect, and only the points of
+    the last intersecting part of each (transect, shoreline) are kept.
+
+    Parameters:
+        index (TransectIndex): Index of the transects.
+        shore_ids (list): IDs of the shorelines.
+        part_shore (np.ndarray): Position (in shore_ids) of the shoreline of each part.
+        transect_idx (np.ndarray): Position of the transect of each hit.
+        part_idx (np.ndarray): Position of the shoreline part of each hit.
+        xy (np.ndarray): (n, 2) array with the coordinates of each hit.
+        t (np.ndarray): Position of each hit along its transect.
+
+    Returns:
+        np.ndarray: Structured array (see INTERSECTION_DTYPE).
+    """
+    shore_idx = part_shore[part_idx]
+
+    # Sort by transect, shoreline, part and position along the transect
+    order = np.lexsort((t, part_idx, shore_idx, transect_idx))
+    transect_idx, part_idx, shore_idx, xy, t = transect_idx[order], part_idx[order], shore_idx[order], xy[order], t[order]
+
+    # Keep only the points of the last intersecting part of each (transect, shoreline)
+    if len(t):
+        new_group = np.ones(len(t), dtype=bool)
+        new_group[1:] = (transect_idx[1:] != transect_idx[:-1]) | (shore_idx[1:] != shore_idx[:-1])
+        starts = np.flatnonzero(new_group)
+        last_part = np.maximum.reduceat(part_idx, starts)
+        keep = part_idx == np.repeat(last_part, np.diff(np.append(starts, len(t))))
+        transect_idx, part_idx, shore_idx, xy, t = transect_idx[keep], part_idx[keep], shore_idx[keep], xy[keep], t[keep]
+
+    result = np.empty(len(t), dtype=INTERSECTION_DTYPE)
+    result['transect_id'] = index.ids[transect_idx]
+    result['shore_id'] = np.asarray(shore_ids)[shore_idx]
+    result['x'] = xy[:, 0]
+    result['y'] = xy[:, 1]
+    result['t_along'] = t
+    # The parts are grouped by shoreline, so the position within the shoreline is relative to its first part
+    result['part_index'] = part_idx - np.searchsorted(part_shore, shore_idx, side='left')
+    return result
+
+
+def intersect_shorelines_indexed(transects_feature, shorelines_feature):
+    """
+    Computes the intersection between the shorelines and transects using a spatial index.
+    The transects are indexed in an STRtree and all the shoreline parts are queried in bulk, so the
+    intersection is only computed for the candidate pairs instead of every transect/shoreline pair.
+    As in the exhaustive search, only the points of the last intersecting part of each shoreline are kept.
+    MultiPoints are broken down into one row per point, and collinear overlaps are represented by their
+    first vertex.
+
+    Parameters:
+        transects_feature (dict or TransectIndex): Shapely LineString objects with the transect ID as key
+                                                   (or their prebuilt index).
+        shorelines_feature (dict): Shapely LineString/MultiLineString objects with the shoreline ID as key.
+
+    Returns:
+        np.ndarray: Structured array (see INTERSECTION_DTYPE), sorted by transect, shoreline and t_along.
+    """
+    index = _as_transect_index(transects_feature)
+    shore_ids, parts, part_shore = explode_shorelines(shorelines_feature)
+    if len(index) == 0 or len(parts) == 0:
+        return np.empty(0, dtype=INTERSECTION_DTYPE)
+
+    # Query the candidate (transect, shoreline part) pairs in bulk
+    part_idx, transect_idx = index.tree.query(parts, predicate='intersects')
+
+    # Compute the intersection of all the candidate pairs at once
+    intersections = shapely.intersection(index.geoms[transect_idx], parts[part_idx])
+
+    # Break down the intersections (MultiPoints and collections) into single geometries
+    pieces, pair = shapely.get_parts(intersections, return_index=True)
+    pieces, sub = shapely.get_parts(pieces, return_index=True)
+    pair = pair[sub]
+    not_empty = ~shapely.is_empty(pieces)
+    pieces, pair = pieces[not_empty], pair[not_empty]
+
+    # One point per piece: the point itself or the first vertex of a line
+    coords, coord_piece = shapely.get_coordinates(pieces, return_index=True)
+    xy = coords[np.searchsorted(coord_piece, np.arange(len(pieces)))]
+    transect_idx, part_idx = transect_idx[pair], part_idx[pair]
+
+    # Position of the points along their transect
+    direction = index.end[transect_idx] - index.start[transect_idx]
+    t = np.einsum('ij,ij->i', xy - index.start[transect_idx], direction) / np.einsum('ij,ij->i', direction, direction)
+
+    return _collect_hits(index, shore_ids, part_shore, transect_idx, part_idx, xy, t)
+
+
+def cross_shore_distances(hits, index, base_xy):
+    """
+    Computes the signed cross-shore distance of the intersection points from the baseline: the projection of the
+    vector from the baseline intersection of the transect to the point onto the unit vector of the transect.
+    The distance is positive seaward of the baseline and negative landward of it.
+
+    Parameters:
+        hits (np.ndarray): Structured array of intersection points (see INTERSECTION_DTYPE).
+        index (TransectIndex): Index of the transects.
+        base_xy (np.ndarray): (n, 2) array with the baseline intersection of each transect of the index
+                              (in the order of index.ids, NaN if the transect does not intersect the baseline).
+
+    Returns:
+        np.ndarray: Signed distance of each point (NaN if its transect does not intersect the baseline).
+    """
+    if len(hits) == 0:
+        return np.empty(0)
+    pos = index.positions(hits['transect_id'])
+    offset = np.column_stack([hits['x'], hits['y']]) - base_xy[pos]
+    return np.einsum('ij,ij->i', offset, index.unit[pos])
+
+
+def resolve_multiple_intersections(hits, distances, policy="Closest"):
+    """
+    Selects one point for each (transect, shoreline) with multiple intersections, with a single sort of all the
+    points followed by a reduction by group.
+    Policies:
+        - "Closest": the point closest to the baseline (smallest absolute distance from the baseline).
+        - "Farthest": the point farthest from the baseline (largest absolute distance).
+        - "Seaward-most": the point closest to the seaward end of the transect (largest t_along).
+        - "Median": the point with the median (signed) distance from the baseline (the lower one for an even
+          number of points).
+        - "All": all the points are kept (e.g. for quality control).
+    Points without distance (NaN, transect without baseline intersection) are only selected if there is no other point.
+
+    Parameters:
+        hits (np.ndarray): Structured array of intersection points (see INTERSECTION_DTYPE).
+        distances (np.ndarray): Signed distance from the baseline of each point (see cross_shore_distances).
+        policy (str): Selection policy.
+
+    Returns:
+        np.ndarray: Positions (in hits) of the selected points, in their original order.
+    """
+    if policy == "All" or len(hits) == 0:
+        return np.arange(len(hits))
+
+    distances = np.asarray(distances, dtype=float)
+    if policy == "Seaward-most":
+        key = -hits['t_along']
+    elif policy == "Farthest":
+        key = -np.abs(distances)
+    elif policy == "Median":
+        key = distances
+    else:
+        key = np.abs(distances)
+    # Sort by transect, shoreline and key (NaN keys are placed at the end of each group)
+    order = np.lexsort((np.isnan(key), key, hits['shore_id'], hits['transect_id']))
+
+    transect_ids, shore_ids = hits['transect_id'][order], hits['shore_id'][order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (transect_ids[1:] != transect_ids[:-1]) | (shore_ids[1:] != shore_ids[:-1])
+    starts = np.flatnonzero(new_group)
+
+    if policy == "Median":
+        # Position of the lower median among the points with a valid distance of each group
+        valid = np.add.reduceat(~np.isnan(key[order]), starts)
+        selected = starts + (np.maximum(valid, 1) - 1) // 2
+    else:
+        selected = starts
+
+    return np.sort(order[selected])
+
+
+def shoreline_segments(parts):
+    """
+    Splits the shoreline parts into their segments.
+
+    Parameters:
+        parts (np.ndarray): Shapely LineString objects.
+
+    Returns:
+        seg_start (np.ndarray): (m, 2) array with the start vertex of each segment.
+        seg_end (np.ndarray): (m, 2) array with the end vertex of each segment.
+        seg_part (np.ndarray): (m,) array with the position of the part of each segment.
+        seg_is_last (np.ndarray): (m,) boolean array, True for the last segment of each part.
+    """
+    coords, coord_part = shapely.get_coordinates(parts, return_index=True)
+    # A segment joins two consecutive vertices of the same part
+    seg_first = np.flatnonzero(coord_part[:-1] == coord_part[1:])
+    seg_part = coord_part[seg_first]
+    seg_is_last = np.ones(len(seg_first), dtype=bool)
+    seg_is_last[:-1] = seg_part[:-1] != seg_part[1:]
+    return coords[seg_first], coords[seg_first + 1], seg_part, seg_is_last
+
+
+def transect_endpoints(transect_geoms):
+    """
+    Gets the first and last vertex of each transect (transects are two-point segments).
+
+    Parameters:
+        transect_geoms (np.ndarray): Shapely LineString objects.
+
+    Returns:
+        start (np.ndarray): (n, 2) array with the first vertex of each transect.
+        end (np.ndarray): (n, 2) array with the last vertex of each transect.
+    """
+    coords, coord_idx = shapely.get_coordinates(transect_geoms, return_index=True)
+    positions = np.arange(len(transect_geoms))
+    first = np.searchsorted(coord_idx, positions, side='left')
+    last = np.searchsorted(coord_idx, positions, side='right') - 1
+    return coords[first], coords[last]
+
+
+def intersect_shorelines_analytic(transects_feature, shorelines_feature):
+    """
+    Computes the intersection between the shorelines and the transects analytically.
+    Every transect is a two-point segment, so its intersection with a shoreline segment is solved in
+    parametric form for all the candidate (transect, shoreline segment) pairs at once. The candidates are
+    found by querying the envelopes of the shoreline segments against the STRtree of the transects.
+    The points are the same as the GEOS engine (intersect_shorelines_indexed): for each (transect, shoreline)
+    only the points of the last intersecting part of the shoreline are kept. Collinear overlaps between a
+    transect and a shoreline segment are not reported.
+
+    Parameters:
+        transects_feature (dict or TransectIndex): Shapely LineString objects with the transect ID as key
+                                                   (or their prebuilt index).
+        shorelines_feature (dict): Shapely LineString/MultiLineString objects with the shoreline ID as key.
+
+    Returns:
+        np.ndarray: Structured array (see INTERSECTION_DTYPE), sorted by transect, shoreline and t_along.
+    """
+    index = _as_transect_index(transects_feature)
+    shore_ids, parts, part_shore = explode_shorelines(shorelines_feature)
+    if len(index) == 0 or len(parts) == 0:
+        return np.empty(0, dtype=INTERSECTION_DTYPE)
+
+    p_start, p_end = index.start, index.end
+    q_start, q_end, seg_part, seg_is_last = shoreline_segments(parts)
+
+    # Candidate pairs: the envelope of the shoreline segment intersects the envelope of the transect
+    envelopes = shapely.box(np.minimum(q_start[:, 0], q_end[:, 0]), np.minimum(q_start[:, 1], q_end[:, 1]),
+                            np.maximum(q_start[:, 0], q_end[:, 0]), np.maximum(q_start[:, 1], q_end[:, 1]))
+    seg_idx, transect_idx = index.tree.query(envelopes)
+
+    # Solve all the segment/segment intersections at once
+    t, u = segment_intersections(p_start[transect_idx], p_end[transect_idx], q_start[seg_idx], q_end[seg_idx])
+    # The end vertex of a segment is the start of the next one, so it only counts for the last segment of a part
+    hit = (t >= 0) & (t <= 1) & (u >= 0) & ((u < 1) | ((u <= 1) & seg_is_last[seg_idx]))
+    transect_idx, seg_idx, t = transect_idx[hit], seg_idx[hit], t[hit]
+    xy = p_start[transect_idx] + t[:, None] * (p_end[transect_idx] - p_start[transect_idx])
+
+    return _collect_hits(index, shore_ids, part_shore, transect_idx, seg_part[seg_idx], xy, t)
+
+
+def share_arrays(arrays):
+    """
+    Copies NumPy arrays to shared memory blocks, so the worker processes can read them without pickling.
+
+    Parameters:
+        arrays (dict): NumPy arrays (numeric dtypes) with their name as key.
+
+    Returns:
+        handles (list): SharedMemory objects (they must be closed and unlinked by the caller when done).
+        specs (dict): (block name, shape, dtype) of each array with its name as key (see attach_arrays).
+    """
+    handles, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        handles.append(shm)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        specs[name] = (shm.name, array.shape, array.dtype.str)
+    return handles, specs
+
+
+def attach_arrays(specs, slices=None):
+    """
+    Copies the arrays shared with share_arrays (or only a range of their rows) into the memory of the current process.
+    The range is sliced from the shared memory before copying, so the rest of the array is never copied.
+
+    Parameters:
+        specs (dict): (block name, shape, dtype) of each array with its name as key.
+        slices (dict): Range of rows (slice) to copy of some arrays, with their name as key (all the rows by default).
+
+    Returns:
+        dict: NumPy arrays with their name as key.
+    """
+    slices = slices or {}
+    arrays = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[slices.get(name, slice(None))].copy()
+        shm.close()
+    return arrays
+
+
+@contextmanager
+def shared_transects(transects_feature):
+    """
+    Shares the coordinates of the transects with the worker processes of intersect_shorelines_parallel.
+    The transects are shared once and reused by all the calls (e.g. for each chunk of shorelines), so every
+    worker builds their TransectIndex only once per run. The shared memory is released on exit.
+
+    Parameters:
+        transects_feature (dict or TransectIndex): Shapely LineString objects with the transect ID as key
+                                                   (or their prebuilt index).
+
+    Returns:
+        Context manager that yields the specs of the shared transects (see share_arrays).
+    """
+    index = _as_transect_index(transects_feature)
+    coords, coord_idx = shapely.get_coordinates(index.geoms, return_index=True)
+    offsets = np.searchsorted(coord_idx, np.arange(len(index) + 1))
+    handles, specs = share_arrays({'coords': coords, 'offsets': offsets})
+    try:
+        yield specs
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+
+def _lines_from_coords(coords, offsets):
+    """Builds Shapely LineStrings from their concatenated coordinates and the offset of each line."""
+    indices = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return shapely.linestrings(coords, indices=indices)
+
+
+# Transect index of the shared transects in each worker process (built once per parallel run)
+_WORKER_TRANSECTS = {}
+
+
+def _intersect_shoreline_block(task):
+    """
+    Worker of intersect_shorelines_parallel: intersects all the transects with a block of consecutive shorelines.
+    The transects and shorelines are identified by their positions, so no Shapely objects are pickled in either direction.
+
+    Parameters:
+        task (tuple): (transect specs, shoreline specs, first shoreline, last shoreline (excluded),
+                       first part, last part (excluded), engine).
+
+    Returns:
+        np.ndarray: Structured array (see INTERSECTION_DTYPE) with positions instead of IDs.
+    """
+    transect_specs, shore_specs, first_shore, last_shore, first_part, last_part, engine = task
+
+    # The transects are the same for all the blocks (and chunks) of a run, so they are rebuilt once per worker
+    key = transect_specs['coords'][0]
+    if key not in _WORKER_TRANSECTS:
+        _WORKER_TRANSECTS.clear()
+        transects = attach_arrays(transect_specs)
+        geoms = _lines_from_coords(transects['coords'], transects['offsets'])
+        _WORKER_TRANSECTS[key] = TransectIndex(dict(enumerate(geoms)))
+    index = _WORKER_TRANSECTS[key]
+
+    # Rebuild the parts of the shorelines of the block (only the parts and vertices of the block are copied)
+    offsets = attach_arrays({'offsets': shore_specs['offsets']}, {'offsets': slice(first_part, last_part + 1)})['offsets']
+    shorelines = attach_arrays({'coords': shore_specs['coords'], 'part_shore': shore_specs['part_shore']},
+                               {'coords': slice(offsets[0], offsets[-1]), 'part_shore': slice(first_part, last_part)})
+    parts = _lines_from_coords(shorelines['coords'], offsets - offsets[0])
+    block = (list(range(first_shore, last_shore)), parts, shorelines['part_shore'] - first_shore)
+
+    if engine == "Analytic":
+        return intersect_shorelines_analytic(index, block)
+    return intersect_shorelines_indexed(index, block)
+
+
+def shoreline_blocks(part_shore, offsets, n_shorelines, n_blocks):
+    """
+    Splits the shorelines into blocks of consecutive shorelines with a similar number of vertices.
+
+    Parameters:
+        part_shore (np.ndarray): Position of the shoreline of each part.
+        offsets (np.ndarray): Offset of the first vertex of each part (plus the total number of vertices).
+        n_shorelines (int): Number of shorelines.
+        n_blocks (int): Maximum number of blocks.
+
+    Returns:
+        list: (first shoreline, last shoreline (excluded)) of each block.
+    """
+    vertices = np.bincount(part_shore, weights=np.diff(offsets), minlength=n_shorelines)
+    cumulative = np.cumsum(vertices)
+    targets = cumulative[-1] * np.arange(1, n_blocks) / n_blocks if n_shorelines else []
+    bounds = np.unique(np.concatenate([[0], np.searchsorted(cumulative, targets, side='right'), [n_shorelines]]))
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def intersect_shorelines_parallel(transects_feature, shorelines_feature, pool, workers, engine="GEOS",
+                                  transect_specs=None):
+    """
+    Computes the intersection between the shorelines and transects in a process pool.
+    The shorelines are split into blocks of consecutive shorelines (e.g. date ranges) with a similar number
+    of vertices, and each worker intersects all the transects with one block. The coordinates of the
+    transects and shorelines are shared with the workers through shared memory.
+    The results are merged in the same order as the serial engines, so the output is identical.
+
+    Parameters:
+        transects_feature (dict or TransectIndex): Shapely LineString objects with the transect ID as key
+                                                   (or their prebuilt index).
+        shorelines_feature (dict): Shapely LineString/MultiLineString objects with the shoreline ID as key.
+        pool (concurrent.futures.Executor): Process pool used to run the workers.
+        workers (int): Number of worker processes of the pool.
+        engine (str): Intersection engine ("GEOS" or "Analytic").
+        transect_specs (dict): Transects already shared with shared_transects (e.g. for all the chunks of
+                               shorelines of a run). If None, they are shared only for this call.
+
+    Returns:
+        np.ndarray: Structured array (see INTERSECTION_DTYPE), sorted by transect, shoreline and t_along.
+    """
+    index = _as_transect_index(transects_feature)
+    shore_ids, parts, part_shore = explode_shorelines(shorelines_feature)
+    if len(index) == 0 or len(parts) == 0:
+        return np.empty(0, dtype=INTERSECTION_DTYPE)
+    if transect_specs is None:
+        with shared_transects(index) as transect_specs:
+            return intersect_shorelines_parallel(index, (shore_ids, parts, part_shore), pool, workers,
+                                                 engine=engine, transect_specs=transect_specs)
+
+    # Coordinates of the shoreline parts, with the offset of the first vertex of each part
+    part_shore = np.asarray(part_shore, dtype=np.int64)
+    part_coords, part_idx = shapely.get_coordinates(parts, return_index=True)
+    part_offsets = np.searchsorted(part_idx, np.arange(len(parts) + 1))
+
+    # Several blocks per worker to balance the load, with the range of parts of each block
+    blocks = shoreline_blocks(part_shore, part_offsets, len(shore_ids), workers * 4)
+    part_bounds = np.searchsorted(part_shore, blocks).tolist() if blocks else []
+
+    shore_handles, shore_specs = share_arrays({'coords': part_coords, 'offsets': part_offsets, 'part_shore': part_shore})
+    try:
+        tasks = [(transect_specs, shore_specs, first, last, first_part, last_part, engine)
+                 for (first, last), (first_part, last_part) in zip(blocks, part_bounds)]
+        results = list(pool.map(_intersect_shoreline_block, tasks))
+    finally:
+        for shm in shore_handles:
+            shm.close()
+            shm.unlink()
+
+    # The blocks are in shoreline order, so a stable sort by transect gives the order of the serial engines
+    hits = np.concatenate(results)
+    hits = hits[np.argsort(hits['transect_id'], kind='stable')]
+    hits['transect_id'] = index.ids[hits['transect_id']]
+    hits['shore_id'] = np.asarray(shore_ids)[hits['shore_id']]
+    return hits
@@ -7,7 +7,7 @@ import os
 import re
 import contextily as cx
 import cartopy.crs as ccrs
-from tools.utils.generic_funs import line_arcgis2shapely
+from tools.utils.generic_funs import line_arcgis2shapely, load_attributes
 from matplotlib.patches import Patch
 import matplotlib.patheffects as pe
 from matplotlib.colors import Normalize, TwoSlopeNorm
@@ -67,7 +67,7 @@ class PlottingUtils():
         """
         fields = [field.name for field in arcpy.ListFields(feature_class)]
 
-        return pd.DataFrame([row for row in arcpy.da.SearchCursor(feature_class, fields)], columns=fields)
+        return load_attributes(feature_class, fields)
     
 
     def _get_UTM_projection(self):
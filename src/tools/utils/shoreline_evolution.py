@@ -1,7 +1,103 @@
 import statsmodels.api as sm
+from scipy import stats
 import pandas as pd
 import numpy as np
 
+# Define a class with the intersection points sorted and partitioned by transect
+class TransectPartition:
+    def __init__(self, df, transect_field='transect_id'):
+        """
+        Class constructor. The data is sorted by transect and date and the dates are parsed only once.
+        The points of each transect are a contiguous slice of the arrays, delimited by the offsets
+        (CSR-style), so they can be accessed without copying or filtering the whole table.
+        
+        Params:
+            df (pandas.DataFrame): Time series data with the transect ID, 'date' and 'distance_from_base' columns.
+            transect_field (str): Name of the transect ID column.
+        """
+        dates = pd.to_datetime(df['date']) if df['date'].dtype == 'object' else df['date']
+        transects = np.asarray(df[transect_field].values)
+        dates = np.asarray(dates.values).astype('datetime64[ns]')
+        
+        # Sort by transect and date (stable, so the order of equal dates is kept)
+        order = np.lexsort((dates, transects))
+        transects = transects[order]
+        self.dates = dates[order]
+        self.values = np.asarray(df['distance_from_base'].values, dtype=float)[order]
+        
+        # First row of each transect (plus the total number of rows)
+        starts = np.flatnonzero(np.r_[True, transects[1:] != transects[:-1]]) if len(transects) else np.empty(0, dtype=int)
+        self._set_transects(transects[starts], np.r_[starts, len(transects)])
+    
+    @classmethod
+    def from_arrays(cls, transect_ids, offsets, dates, values):
+        """
+        Builds a partition from arrays that are already sorted by transect and date.
+        
+        Params:
+            transect_ids (numpy.ndarray): ID of each transect.
+            offsets (numpy.ndarray): First row of each transect (plus the total number of rows).
+            dates (numpy.ndarray): Dates of the points (datetime64).
+            values (numpy.ndarray): Distances from the baseline of the points.
+        
+        Returns:
+            TransectPartition: Partition using the given arrays (not copied).
+        """
+        partition = cls.__new__(cls)
+        partition.dates, partition.values = dates, values
+        partition._set_transects(transect_ids, offsets)
+        return partition
+    
+    def _set_transects(self, transect_ids, offsets):
+        """Sets the transect IDs and offsets of the partition."""
+        self.transect_ids = transect_ids
+        self.offsets = offsets
+        self._positions = {transect_id: i for i, transect_id in enumerate(self.transect_ids.tolist())}
+    
+    def __len__(self):
+        """Number of transects."""
+        return len(self.transect_ids)
+    
+    def split(self, n_chunks, overhead=20):
+        """
+        Splits the partition into chunks of consecutive transects with a similar amount of work.
+        The work of a transect is estimated as its number of points plus a fixed overhead (the cost of fitting
+        a model), so transects with many observations end up in smaller chunks.
+        
+        Params:
+            n_chunks (integer): Maximum number of chunks.
+            overhead (float): Fixed cost of each transect, in number of points.
+        
+        Returns:
+            list: TransectPartition objects with the slices of the arrays of each chunk, in transect order.
+        """
+        # Cumulative work at the start of each transect (and at the end of the last one)
+        work = self.offsets + overhead * np.arange(len(self.offsets))
+        targets = work[-1] * np.arange(1, n_chunks) / n_chunks
+        bounds = np.unique(np.r_[0, np.searchsorted(work, targets), len(self)])
+        chunks = []
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            start, end = self.offsets[first], self.offsets[last]
+            chunks.append(TransectPartition.from_arrays(self.transect_ids[first:last],
+                                                        self.offsets[first:last + 1] - start,
+                                                        self.dates[start:end], self.values[start:end]))
+        return chunks
+    
+    def slice(self, transect_id):
+        """
+        Gets the points of a transect (views of the partition arrays, not copies).
+        
+        Params:
+            transect_id (integer): Number of the transect.
+        
+        Returns:
+            tuple: Arrays with the dates and the distances from the baseline of the transect, sorted by date.
+        """
+        i = self._positions[transect_id]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.dates[start:end], self.values[start:end]
+
+
 # Define a class with functions to calculate the metrics of the shoreline evolution analysis
 class ShorelineEvolution:
     def __init__(self, df, transect_id):
@@ -9,27 +105,27 @@ class ShorelineEvolution:
         Class constructor
         
         Params: 
-            df (pandas.DataFrame): Time series data with at least three columns, one for dates, one for the variable of interest and another for transects.
+            df (pandas.DataFrame or TransectPartition): Time series data with at least three columns, one for dates, one for the variable
+                of interest and another for transects. With a TransectPartition, the points of the transect are used without copying.
             transect_id (integer): Number of the transect in which the analysis will be performed.
         """
-        # Copy the DataFrame
-        self.df = df.copy()
         self.transect_id = transect_id
         
-        # Select only the values of the transect of interest
-        self.df = self.df.loc[self.df['transect_id'] == self.transect_id, ['date', 'distance_from_base']]
-        
-        # Set date as index
-        if self.df['date'].dtype == 'object':
-            self.df['date'] = pd.to_datetime(self.df['date'])
-        self.df.set_index('date', inplace=True)
+        if isinstance(df, TransectPartition):
+            # Pre-sliced and sorted data of the transect
+            self.dates, self.y = df.slice(transect_id)
+        else:
+            # Select only the values of the transect of interest
+            df = df.loc[df['transect_id'] == self.transect_id, ['date', 'distance_from_base']]
+            dates = pd.to_datetime(df['date']) if df['date'].dtype == 'object' else df['date']
+            self.dates = np.asarray(dates.values).astype('datetime64[ns]')
+            self.y = df['distance_from_base'].values
               
-        # Calculate the number of days elapsed since the first date
-        self.df['days'] = ((self.df.index - self.df.index[0]).days) / 365.24
+        # Calculate the number of years elapsed since the first date (in whole days)
+        self.days = np.floor((self.dates - self.dates[0]) / np.timedelta64(1, 'D'))
         
         # Convert data to arrays
-        self.X = self.df['days'].values.reshape(-1, 1)
-        self.y = self.df['distance_from_base'].values
+        self.X = (self.days / 365.24).reshape(-1, 1)
         
         # Fit linear regression
         self.lr = sm.OLS(self.y, sm.add_constant(self.X)).fit()
@@ -85,7 +181,7 @@ class ShorelineEvolution:
         Returns:
             float: SCE
         """
-        return self.df['distance_from_base'].max() - self.df['distance_from_base'].min()
+        return np.nanmax(self.y) - np.nanmin(self.y)
     
     def NSM(self):
         """
@@ -94,7 +190,7 @@ class ShorelineEvolution:
         Returns:
             float: NSM
         """
-        return self.df.iloc[-1]['distance_from_base'] - self.df.iloc[0]['distance_from_base']
+        return self.y[-1] - self.y[0]
 
     def EPR(self):
         """
@@ -104,7 +200,7 @@ class ShorelineEvolution:
         Returns:
             float: EPR (m/year)
         """
-        years = (self.df.index[-1] - self.df.index[0]).days / 365.24
+        years = self.days[-1] / 365.24
         return self.NSM() / years
 
     def compute_all_metrics(self):
@@ -126,4 +222,449 @@ class ShorelineEvolution:
             "SCE": self.SCE(),
             "NSM": self.NSM(),
             "EPR": self.EPR(),
-        }
\ No newline at end of file
+        }
+
+
+# Function to keep one point per transect and date
+def closest_to_baseline(df, transect_field='transect_id'):
+    """
+    Keeps, for each transect and date, the point closest to the baseline (smallest absolute distance_from_base),
+    as the "Closest" policy of the intersection tool. The distances are signed (negative landward of the baseline),
+    so the minimum distance would be the most landward point instead.
+    Points without distance (NaN) are only kept if there is no other point of the transect and date.
+
+    Params:
+        df (pandas.DataFrame): Data with the transect ID, 'date' and 'distance_from_base' columns.
+        transect_field (str): Name of the transect ID column.
+
+    Returns:
+        pandas.DataFrame: One row per transect and date.
+    """
+    order = df['distance_from_base'].abs().sort_values(kind='stable', na_position='last').index
+    return df.loc[order].drop_duplicates(subset=[transect_field, 'date'], keep='first').sort_index().reset_index(drop=True)
+
+
+# Function to compute the metrics of all the transects at once
+def compute_metrics_batched(data, transect_field='transect_id'):
+    """
+    Computes the same metrics as ShorelineEvolution.compute_all_metrics for all the transects in one pass.
+    The data is sorted by transect and date once (see TransectPartition), and the closed-form OLS estimates (slope, intercept,
+    standard error, t-based 95% confidence interval, p-value, R-squared and RMSE) are obtained from grouped
+    sums over the rows of each transect, instead of fitting one statsmodels model per transect.
+    Transects whose points all fall on the same day (e.g. a single point) have no slope: as with the pseudo-inverse
+    used by statsmodels, LRR is 0, the intercept is the mean distance and the model has one degree of freedom less.
+    
+    Params:
+        data (pandas.DataFrame or TransectPartition): Time series data with the transect ID, 'date' and 'distance_from_base'
+            columns (or already partitioned by transect).
+        transect_field (str): Name of the transect ID column.
+    
+    Returns:
+        pandas.DataFrame: One row per transect (sorted by transect ID) with the transect ID and the metrics
+                          (same columns as compute_all_metrics).
+    """
+    partition = data if isinstance(data, TransectPartition) else TransectPartition(data, transect_field)
+    if len(partition) == 0:
+        return pd.DataFrame(columns=[transect_field, "LRR", "LCI_low", "LCI_upp", "R2", "Pvalue", "RMSE", "SCE", "NSM", "EPR"])
+    
+    # First and last row of each transect and number of rows
+    dates, y = partition.dates, partition.values
+    starts = partition.offsets[:-1]
+    n = np.diff(partition.offsets)
+    ends = starts + n - 1
+    group = np.repeat(np.arange(len(starts)), n)
+    
+    # Years elapsed since the first date of each transect (whole days, as in ShorelineEvolution)
+    days = np.floor((dates - dates[starts][group]) / np.timedelta64(1, 'D'))
+    t = days / 365.24
+    
+    # Grouped sums (centered on the mean of each transect for numerical stability)
+    t_mean = np.add.reduceat(t, starts) / n
+    y_mean = np.add.reduceat(y, starts) / n
+    dt = t - t_mean[group]
+    dy = y - y_mean[group]
+    s_tt = np.add.reduceat(dt * dt, starts)
+    s_ty = np.add.reduceat(dt * dy, starts)
+    s_yy = np.add.reduceat(dy * dy, starts)
+    
+    # Transects without time span (the design matrix has rank 1)
+    degenerate = s_tt == 0
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Closed-form OLS: slope, intercept and residuals (minimum-norm solution, slope 0, for the degenerate transects)
+        slope = np.where(degenerate, 0.0, s_ty / s_tt)
+        intercept = y_mean - slope * t_mean
+        residuals = y - (intercept[group] + slope[group] * t)
+        sse = np.add.reduceat(residuals * residuals, starts)
+        
+        # Standard error of the slope, t-based 95% confidence interval and p-value
+        dof = n - 2 + degenerate
+        se = np.where(degenerate, 0.0, np.sqrt(sse / dof / s_tt))
+        t_crit = stats.t.ppf(0.975, dof)
+        p_value = 2 * stats.t.sf(np.abs(slope / se), dof)
+        
+        r2 = 1 - sse / s_yy
+        rmse = np.sqrt(sse / n)
+        
+        # Envelope, net movement and end point rate
+        sce = np.fmax.reduceat(y, starts) - np.fmin.reduceat(y, starts)
+        nsm = y[ends] - y[starts]
+        epr = nsm / t[ends]
+    
+    return pd.DataFrame({transect_field: partition.transect_ids, "LRR": slope,
+                         "LCI_low": slope - t_crit * se, "LCI_upp": slope + t_crit * se,
+                         "R2": r2, "Pvalue": p_value, "RMSE": rmse, "SCE": sce, "NSM": nsm, "EPR": epr})
+
+
+# Function to compute the metrics of the transects of a chunk (run by the workers of compute_metrics_parallel)
+def compute_metrics_chunk(partition, transect_field='transect_id'):
+    """
+    Computes the metrics of all the transects of a partition, one ShorelineEvolution model per transect.
+    
+    Params:
+        partition (TransectPartition): Points of the transects (e.g. a chunk of TransectPartition.split).
+        transect_field (str): Name of the transect ID column.
+    
+    Returns:
+        list: Dictionary with the transect ID and the metrics (see compute_all_metrics) of each transect, in transect order.
+    """
+    metrics_list = []
+    for transect_id in partition.transect_ids.tolist():
+        metrics = {transect_field: transect_id}
+        metrics.update(ShorelineEvolution(df=partition, transect_id=transect_id).compute_all_metrics())
+        metrics_list.append(metrics)
+    return metrics_list
+
+
+# Function to compute the metrics of the transects in a process pool
+def compute_metrics_parallel(partition, pool, workers, transect_field='transect_id'):
+    """
+    Computes the metrics of all the transects with one ShorelineEvolution model per transect in a process pool.
+    The transects are split into chunks with a similar number of observations (several per worker, to balance
+    the load) and the workers receive only the NumPy slices of their chunk.
+    
+    Params:
+        partition (TransectPartition): Points of all the transects.
+        pool (concurrent.futures.Executor): Process pool used to run the workers.
+        workers (integer): Number of worker processes of the pool.
+        transect_field (str): Name of the transect ID column.
+    
+    Returns:
+        pandas.DataFrame: One row per transect (in transect ID order) with the transect ID and the metrics.
+    """
+    chunks = partition.split(workers * 4)
+    # pool.map returns the chunks in order, so the transects keep the order of the partition
+    results = pool.map(compute_metrics_chunk, chunks, [transect_field] * len(chunks))
+    return pd.DataFrame([metrics for chunk_metrics in results for metrics in chunk_metrics])
+
+
+# Sufficient statistics of the linear regression of each transect (see update_sufficient_statistics)
+STATISTICS_FIELDS = ["n", "sum_t", "sum_tt", "sum_y", "sum_ty", "sum_yy", "min_y", "max_y",
+                     "first_date", "first_y", "last_date", "last_y"]
+
+
+# Function to add new observations to the sufficient statistics of the transects
+def update_sufficient_statistics(statistics, partition, transect_field='transect_id'):
+    """
+    Adds new observations to the sufficient statistics of the transects: number of points, sums of t, t^2, y,
+    t*y and y^2 (t in years since the first date of the transect, in whole days, as in ShorelineEvolution),
+    minimum and maximum distance and the first and last observation. The metrics of the transects can then be
+    updated (see metrics_from_statistics) in O(new points), without reading the previous observations again.
+    Only observations later than the last one of their transect can be added, since the first date (origin of t)
+    and the last observation of the transects must not change.
+    
+    Params:
+        statistics (pandas.DataFrame): Current statistics (transect ID and STATISTICS_FIELDS columns), empty if there are none.
+        partition (TransectPartition): New observations.
+        transect_field (str): Name of the transect ID column.
+    
+    Returns:
+        pandas.DataFrame: Updated statistics, sorted by transect ID (None if an observation is not later than
+                          the last one of its transect).
+    """
+    statistics = statistics.set_index(transect_field) if len(statistics) else \
+        pd.DataFrame(columns=STATISTICS_FIELDS, index=pd.Index([], name=transect_field))
+    if len(partition) == 0:
+        return statistics.reset_index()
+    
+    ids = partition.transect_ids
+    starts = partition.offsets[:-1]
+    n = np.diff(partition.offsets)
+    ends = starts + n - 1
+    group = np.repeat(np.arange(len(ids)), n)
+    dates, y = partition.dates, partition.values
+    
+    # The new observations must be later than the last observation of their transect
+    known = np.isin(ids, statistics.index.values)
+    previous = statistics.reindex(ids)
+    last_dates = pd.to_datetime(previous['last_date']).values.astype('datetime64[ns]')
+    if np.any(known & ~(dates[starts] > last_dates)):
+        return None
+    
+    # Origin of t: the first date of the transect (or of its first new observation if the transect is new)
+    origin = np.where(known, pd.to_datetime(previous['first_date']).values.astype('datetime64[ns]'), dates[starts])
+    t = np.floor((dates - origin[group]) / np.timedelta64(1, 'D')) / 365.24
+    
+    new = pd.DataFrame({"n": n, "sum_t": np.add.reduceat(t, starts), "sum_tt": np.add.reduceat(t * t, starts),
+                        "sum_y": np.add.reduceat(y, starts), "sum_ty": np.add.reduceat(t * y, starts),
+                        "sum_yy": np.add.reduceat(y * y, starts),
+                        "min_y": np.fmin.reduceat(y, starts), "max_y": np.fmax.reduceat(y, starts),
+                        "first_date": origin, "first_y": y[starts], "last_date": dates[ends], "last_y": y[ends]},
+                       index=pd.Index(ids, name=transect_field))
+    
+    # Add the new sums to the known transects (their first observation does not change)
+    old = previous[known].set_index(new.index[known])
+    for field in ["n", "sum_t", "sum_tt", "sum_y", "sum_ty", "sum_yy"]:
+        new.loc[known, field] = new.loc[known, field].values + old[field].values.astype(float)
+    new.loc[known, "min_y"] = np.fmin(new.loc[known, "min_y"].values, old["min_y"].values.astype(float))
+    new.loc[known, "max_y"] = np.fmax(new.loc[known, "max_y"].values, old["max_y"].values.astype(float))
+    new.loc[known, "first_y"] = old["first_y"].values.astype(float)
+    
+    # Transects without new observations are kept as they are
+    unchanged = statistics[~statistics.index.isin(ids)]
+    updated = pd.concat([unchanged, new]) if len(unchanged) else new
+    updated["n"] = updated["n"].astype(int)
+    return updated.sort_index().reset_index()
+
+
+# Function to compute the metrics of the transects from their sufficient statistics
+def metrics_from_statistics(statistics, transect_field='transect_id'):
+    """
+    Computes the metrics of the transects (same columns as compute_metrics_batched) from their sufficient
+    statistics (see update_sufficient_statistics).
+    
+    Params:
+        statistics (pandas.DataFrame): Transect ID and STATISTICS_FIELDS columns.
+        transect_field (str): Name of the transect ID column.
+    
+    Returns:
+        pandas.DataFrame: One row per transect (in the order of statistics) with the transect ID and the metrics.
+    """
+    n = statistics["n"].values.astype(float)
+    sum_t, sum_y = statistics["sum_t"].values.astype(float), statistics["sum_y"].values.astype(float)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Centered sums of squares and products
+        s_tt = statistics["sum_tt"].values - sum_t * sum_t / n
+        s_ty = statistics["sum_ty"].values - sum_t * sum_y / n
+        s_yy = statistics["sum_yy"].values - sum_y * sum_y / n
+        
+        # Years elapsed between the first and last observation (in whole days)
+        elapsed = pd.to_datetime(statistics["last_date"]).values - pd.to_datetime(statistics["first_date"]).values
+        years = np.floor(elapsed / np.timedelta64(1, 'D')) / 365.24
+        # Transects without time span have slope 0 and one degree of freedom less (as in compute_metrics_batched)
+        degenerate = years == 0
+        
+        # Closed-form OLS (the residual sum of squares cannot be negative, except for rounding errors)
+        slope = np.where(degenerate, 0.0, s_ty / s_tt)
+        sse = np.maximum(s_yy - slope * s_ty, 0)
+        dof = n - 2 + degenerate
+        se = np.where(degenerate, 0.0, np.sqrt(sse / dof / s_tt))
+        t_crit = stats.t.ppf(0.975, dof)
+        p_value = 2 * stats.t.sf(np.abs(slope / se), dof)
+        
+        # End point rate over the years elapsed between the first and last observation
+        nsm = statistics["last_y"].values - statistics["first_y"].values
+        
+        return pd.DataFrame({transect_field: statistics[transect_field].values, "LRR": slope,
+                             "LCI_low": slope - t_crit * se, "LCI_upp": slope + t_crit * se,
+                             "R2": 1 - sse / s_yy, "Pvalue": p_value, "RMSE": np.sqrt(sse / n),
+                             "SCE": statistics["max_y"].values - statistics["min_y"].values,
+                             "NSM": nsm, "EPR": nsm / years})
+
+
+# Function to compute the median and other order statistics of sorted groups
+def _grouped_order_statistic(sorted_values, starts, positions):
+    """
+    Gets the values at some (fractional) positions of each group of a sorted array, interpolating linearly.
+    
+    Params:
+        sorted_values (numpy.ndarray): Values sorted within each group (groups are contiguous).
+        starts (numpy.ndarray): First position of each group.
+        positions (numpy.ndarray): Position (0-based, may be fractional) within each group.
+    
+    Returns:
+        numpy.ndarray: Value of each group at its position.
+    """
+    low = np.floor(positions).astype(int)
+    high = np.ceil(positions).astype(int)
+    fraction = positions - low
+    return sorted_values[starts + low] * (1 - fraction) + sorted_values[starts + high] * fraction
+
+
+# Function to compute the Theil-Sen rate of all the transects
+def theil_sen_batched(partition, confidence=0.95, max_pairs=5000, chunk_pairs=2000000, seed=0):
+    """
+    Computes the Theil-Sen rate (median of the slopes between all the pairs of points) of all the transects,
+    with its confidence interval from the order statistics of the slopes (Sen, 1968), as scipy.stats.theilslopes.
+    The transects are processed in chunks with at most chunk_pairs slopes, so the memory used is bounded.
+    Transects with more than max_pairs pairs of points use a random sample of max_pairs pairs (randomized
+    median of slopes), and the ranks of the interval are scaled to the size of the sample.
+    Points without distance (NaN) are ignored.
+    
+    Params:
+        partition (TransectPartition): Points of the transects.
+        confidence (float): Confidence level of the interval.
+        max_pairs (integer): Maximum number of pairs of points per transect (above it, the pairs are sampled).
+        chunk_pairs (integer): Maximum number of slopes computed at once.
+        seed (integer): Seed of the random sampling of pairs (the results are reproducible).
+    
+    Returns:
+        pandas.DataFrame: Rate and lower and upper limits of the interval of each transect (in the order of the
+                          partition), with the columns TS_LRR, TS_low and TS_upp.
+    """
+    rng = np.random.default_rng(seed)
+    z = stats.norm.ppf(1 - (1 - confidence) / 2)
+    n_transects = len(partition)
+    rate, lower, upper = (np.full(n_transects, np.nan) for _ in range(3))
+    
+    # Years since the first date of each transect (whole days) and number of pairs of each transect
+    starts = partition.offsets[:-1]
+    n = np.diff(partition.offsets)
+    group = np.repeat(np.arange(n_transects), n)
+    t = np.floor((partition.dates - partition.dates[starts][group]) / np.timedelta64(1, 'D')) / 365.24
+    y = partition.values
+    pairs = np.minimum(n * (n - 1) // 2, max_pairs)
+    
+    # Chunks of consecutive transects with at most chunk_pairs slopes
+    cumulative = np.cumsum(pairs)
+    bounds = np.unique(np.r_[0, np.searchsorted(cumulative, np.arange(chunk_pairs, cumulative[-1] if n_transects else 0,
+                                                                     chunk_pairs), side='right'), n_transects])
+    triu = {}
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        # Pairs of points (row positions) of each transect of the chunk
+        index_i, index_j, pair_group = [], [], []
+        for g in range(first, last):
+            size = n[g]
+            if size < 2:
+                continue
+            if size * (size - 1) // 2 <= max_pairs:
+                if size not in triu:
+                    triu[size] = np.triu_indices(size, 1)
+                i, j = triu[size]
+            else:
+                i, j = rng.integers(0, size, max_pairs), rng.integers(0, size, max_pairs)
+            index_i.append(starts[g] + i)
+            index_j.append(starts[g] + j)
+            pair_group.append(np.full(len(i), g))
+        if not index_i:
+            continue
+        index_i, index_j, pair_group = np.concatenate(index_i), np.concatenate(index_j), np.concatenate(pair_group)
+        
+        # Slopes of the pairs with different dates and valid distances
+        dt = t[index_j] - t[index_i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = (y[index_j] - y[index_i]) / dt
+        valid = (dt != 0) & ~np.isnan(slopes)
+        slopes, pair_group = slopes[valid], pair_group[valid]
+        if len(slopes) == 0:
+            continue
+        
+        # Sort the slopes of each transect and get the median and the ranks of the interval
+        order = np.lexsort((slopes, pair_group))
+        slopes, pair_group = slopes[order], pair_group[order]
+        groups, group_starts, sample_size = np.unique(pair_group, return_index=True, return_counts=True)
+        rate[groups] = _grouped_order_statistic(slopes, group_starts, (sample_size - 1) / 2)
+        
+        # Ranks of Sen's interval among all the slopes of the transect (points with distance only)
+        valid_points = np.bincount(group[~np.isnan(y)], minlength=n_transects)[groups].astype(float)
+        total = valid_points * (valid_points - 1) / 2
+        sigma = np.sqrt(valid_points * (valid_points - 1) * (2 * valid_points + 5) / 18)
+        rank_upper = np.minimum(np.round((total + z * sigma) / 2), total - 1)
+        rank_lower = np.maximum(np.round((total - z * sigma) / 2) - 1, 0)
+        # Scale the ranks to the number of slopes (sample) of each transect
+        scale = (sample_size - 1) / np.maximum(total - 1, 1)
+        lower[groups] = _grouped_order_statistic(slopes, group_starts, np.clip(np.round(rank_lower * scale), 0, sample_size - 1))
+        upper[groups] = _grouped_order_statistic(slopes, group_starts, np.clip(np.round(rank_upper * scale), 0, sample_size - 1))
+    
+    return pd.DataFrame({"TS_LRR": rate, "TS_low": lower, "TS_upp": upper})
+
+
+# Function to compute the robust (Huber or LAD) rate of all the transects
+def robust_irls_batched(partition, loss="huber", c=1.345, confidence=0.95, max_iter=200, tol=1e-10):
+    """
+    Computes a robust linear fit of all the transects at once by iteratively reweighted least squares (IRLS).
+    Each iteration solves the weighted least squares of every transect with grouped sums. The scale of the
+    residuals is re-estimated at each iteration (normalized median absolute residual), as statsmodels RLM.
+        - "huber": Huber loss with tuning constant c. The interval uses the H1 covariance of statsmodels RLM.
+        - "lad": least absolute deviations (median regression). No interval is computed (NaN).
+    The fit starts from the OLS estimate. Points without distance (NaN) are ignored.
+    
+    Params:
+        partition (TransectPartition): Points of the transects.
+        loss (str): Loss function ("huber" or "lad").
+        c (float): Tuning constant of the Huber loss.
+        confidence (float): Confidence level of the interval (normal approximation).
+        max_iter (integer): Maximum number of iterations.
+        tol (float): Convergence tolerance of the rates.
+    
+    Returns:
+        pandas.DataFrame: Rate and lower and upper limits of the interval of each transect (in the order of the
+                          partition), with the columns HUB_LRR, HUB_low and HUB_upp (or LAD_LRR, LAD_low and LAD_upp).
+    """
+    prefix = "HUB" if loss == "huber" else "LAD"
+    n_transects = len(partition)
+    
+    # Years since the first date of each transect (whole days), without the points without distance
+    starts = partition.offsets[:-1]
+    group = np.repeat(np.arange(n_transects), np.diff(partition.offsets))
+    t = np.floor((partition.dates - partition.dates[starts][group]) / np.timedelta64(1, 'D')) / 365.24
+    y = partition.values
+    valid = ~np.isnan(y)
+    t, y, group = t[valid], y[valid], group[valid]
+    n = np.bincount(group, minlength=n_transects).astype(float)
+    
+    def grouped_sum(values):
+        return np.bincount(group, weights=values, minlength=n_transects)
+    
+    def weighted_fit(w):
+        sw, swt, swy = grouped_sum(w), grouped_sum(w * t), grouped_sum(w * y)
+        t_mean, y_mean = swt / sw, swy / sw
+        dt = t - t_mean[group]
+        slope = grouped_sum(w * dt * (y - y_mean[group])) / grouped_sum(w * dt * dt)
+        return slope, y_mean - slope * t_mean
+    
+    def mad_scale(residuals):
+        # Median of the absolute residuals of each transect (sorted within each transect)
+        absolute = np.abs(residuals)
+        order = np.lexsort((absolute, group))
+        group_starts = np.r_[0, np.cumsum(n)[:-1]].astype(int)
+        has_points = n > 0
+        scale = np.full(n_transects, np.nan)
+        scale[has_points] = _grouped_order_statistic(absolute[order], group_starts[has_points], (n[has_points] - 1) / 2) / stats.norm.ppf(0.75)
+        return scale
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept = weighted_fit(np.ones(len(y)))
+        scale = mad_scale(y - intercept[group] - slope[group] * t)
+        for _ in range(max_iter):
+            u = (y - intercept[group] - slope[group] * t) / scale[group]
+            if loss == "huber":
+                w = np.where(np.abs(u) <= c, 1.0, c / np.abs(u))
+            else:
+                w = 1 / np.maximum(np.abs(u), 1e-6)
+            # Perfect fits (zero scale) keep the weight of the points
+            w = np.where(np.isfinite(w), w, 1.0)
+            new_slope, intercept = weighted_fit(w)
+            scale = mad_scale(y - intercept[group] - new_slope[group] * t)
+            converged = np.all((np.abs(new_slope - slope) <= tol * np.maximum(1, np.abs(slope))) | np.isnan(new_slope))
+            slope = new_slope
+            if converged:
+                break
+        
+        lower, upper = np.full(n_transects, np.nan), np.full(n_transects, np.nan)
+        if loss == "huber":
+            # H1 covariance of the slope (Huber, 1981), with the unweighted (X'X)^-1
+            u = (y - intercept[group] - slope[group] * t) / scale[group]
+            psi = np.clip(u, -c, c)
+            psi_deriv = (np.abs(u) <= c).astype(float)
+            m = grouped_sum(psi_deriv) / n
+            var_psi_deriv = grouped_sum((psi_deriv - m[group]) ** 2) / n
+            k = 1 + 2 / n * var_psi_deriv / m ** 2
+            dt = t - (grouped_sum(t) / n)[group]
+            s_tt = grouped_sum(dt * dt)
+            variance = k ** 2 * (grouped_sum(psi ** 2) / (n - 2) * scale ** 2) / m ** 2 / s_tt
+            margin = stats.norm.ppf(1 - (1 - confidence) / 2) * np.sqrt(variance)
+            lower, upper = slope - margin, slope + margin
+    
+    return pd.DataFrame({f"{prefix}_LRR": slope, f"{prefix}_low": lower, f"{prefix}_upp": upper})
@@ -0,0 +1,460 @@
+import hashlib
+import numpy as np
+import shapely
+
+"""
+This file contains the NumPy engine used by the TransectGenerator class to place the transects along the baseline.
+It does not depend on arcpy, so it can also be used (and benchmarked) outside ArcGIS Pro.
+"""
+
+# Longitudinal offset (in meters) of the first transect from the start of the baseline
+LONGITUDINAL_OFFSET = 1.0
+
+
+def baseline_segments(parts):
+    """
+    Builds the segments of a (multipart) baseline and their cumulative arc-length.
+    The parts are measured one after the other without the gaps between them,
+    which is the same convention used by arcpy's positionAlongLine.
+
+    Parameters:
+        parts (list): List of (n, 2) arrays with the vertex coordinates of each part.
+
+    Returns:
+        seg_start (np.ndarray): (m, 2) array with the start vertex of each segment.
+        seg_end (np.ndarray): (m, 2) array with the end vertex of each segment.
+        cum_length (np.ndarray): (m + 1,) array with the arc-length at the start of each segment.
+    """
+    starts, ends = [], []
+    for part in parts:
+        part = np.asarray(part, dtype=float).reshape(-1, 2)
+        if len(part) < 2:
+            continue
+        starts.append(part[:-1])
+        ends.append(part[1:])
+
+    if not starts:
+        empty = np.empty((0, 2))
+        return empty, empty, np.zeros(1)
+
+    seg_start = np.concatenate(starts)
+    seg_end = np.concatenate(ends)
+    seg_length = np.hypot(*(seg_end - seg_start).T)
+    cum_length = np.concatenate(([0.0], np.cumsum(seg_length)))
+
+    return seg_start, seg_end, cum_length
+
+
+def baseline_stations(parts, distance, offset=LONGITUDINAL_OFFSET):
+    """
+    Computes the stations (points along the baseline at the specified interval) in one batch.
+    The first station is placed at `offset` meters from the start of the baseline and the
+    rest every `distance` meters up to the end of the baseline.
+
+    Parameters:
+        parts (list): List of (n, 2) arrays with the vertex coordinates of each part.
+        distance (float): Distance between stations in meters.
+        offset (float): Distance of the first station from the baseline start in meters.
+
+    Returns:
+        stations (np.ndarray): (k, 3) array with the x, y and distance along the baseline of each station.
+        tangents (np.ndarray): (k,) array with the bearing (degrees, 0-360, clockwise from north)
+                               of the baseline segment where each station lies.
+    """
+    seg_start, seg_end, cum_length = baseline_segments(parts)
+    total_length = cum_length[-1]
+
+    if len(seg_start) == 0 or total_length < offset:
+        return np.empty((0, 3)), np.empty(0)
+
+    # Distances along the baseline of every station
+    n_stations = int(np.floor((total_length - offset) / distance)) + 1
+    distance_along = offset + distance * np.arange(n_stations)
+    distance_along = distance_along[distance_along <= total_length]
+
+    # Segment where each station lies (zero-length segments are skipped by the right-sided search)
+    seg_idx = np.searchsorted(cum_length, distance_along, side='right') - 1
+    seg_idx = np.clip(seg_idx, 0, len(seg_start) - 1)
+
+    # Linear interpolation inside the segment
+    seg_vector = seg_end[seg_idx] - seg_start[seg_idx]
+    seg_length = cum_length[seg_idx + 1] - cum_length[seg_idx]
+    fraction = np.divide(distance_along - cum_length[seg_idx], seg_length,
+                         out=np.zeros_like(distance_along), where=seg_length > 0)
+    xy = seg_start[seg_idx] + fraction[:, None] * seg_vector
+
+    # Local tangent of the baseline at each station
+    tangents = np.degrees(np.arctan2(seg_vector[:, 0], seg_vector[:, 1])) % 360
+
+    return np.column_stack((xy, distance_along)), tangents
+
+
+def smoothed_orientations(stations, window_points):
+    """
+    Computes the smoothed baseline orientation at each station using a circular mean over a moving window.
+    The window of station i spans the stations [i - window_points, i + window_points] (truncated at both ends)
+    and the orientation is the circular mean of the bearings between consecutive stations inside it.
+    The sums of sines and cosines of every window are obtained from prefix sums, so the cost is O(n)
+    regardless of the window size.
+
+    Parameters:
+        stations (np.ndarray): (n, 2+) array with the x and y coordinates of the stations.
+        window_points (int): Number of stations on each side of the window.
+
+    Returns:
+        np.ndarray: (n,) array with the smoothed orientations in degrees (0-360).
+    """
+    stations = np.asarray(stations, dtype=float)
+    n = len(stations)
+    if n < 2:
+        return np.zeros(1)  # Default orientation if insufficient points
+
+    # Bearing (unit vector) of each segment between consecutive stations
+    delta = np.diff(stations[:, :2], axis=0)
+    bearings = np.arctan2(delta[:, 0], delta[:, 1])
+
+    if window_points < 1:
+        # Window too small: use the bearing from the previous station (or to the next one for the first station)
+        return np.degrees(np.concatenate((bearings[:1], bearings))) % 360
+
+    # Prefix sums of the unit vectors
+    sum_x = np.concatenate(([0.0], np.cumsum(np.sin(bearings))))
+    sum_y = np.concatenate(([0.0], np.cumsum(np.cos(bearings))))
+
+    # Segments inside the window of each station: from max(0, i - w) to min(n - 1, i + w) - 1
+    idx = np.arange(n)
+    lower = np.maximum(0, idx - window_points)
+    upper = np.minimum(n - 1, idx + window_points)
+
+    # The sum of the vectors of the window has the same direction as their mean
+    window_x = sum_x[upper] - sum_x[lower]
+    window_y = sum_y[upper] - sum_y[lower]
+
+    return np.degrees(np.arctan2(window_x, window_y)) % 360
+
+
+# Inland offset (in meters) of the start of the transects to ensure the intersection with the baseline
+INLAND_OFFSET = 0.5
+
+# Number of rounds (doubling the smoothing window each time) used to remove crossings by smoothing
+SMOOTHING_ROUNDS = 4
+
+# Distance (in meters) kept between a shortened transect and the crossing point
+CROSSING_MARGIN = 1.0
+
+# Structured array used to store the generated transects before writing them
+TRANSECT_DTYPE = np.dtype([('transect_id', '<i4'), ('baseline_id', '<i4'),
+                           ('start_x', '<f8'), ('start_y', '<f8'),
+                           ('end_x', '<f8'), ('end_y', '<f8')])
+
+# Memory layout of a two-point LineString in little-endian Well-Known Binary (41 bytes)
+_LINESTRING_WKB_DTYPE = np.dtype([('byte_order', 'u1'), ('geom_type', '<u4'),
+                                  ('num_points', '<u4'), ('coords', '<f8', (4,))])
+
+
+def transect_records(stations, angles, length, start_id=1, baseline_id=0, inland_offset=INLAND_OFFSET):
+    """
+    Builds the transects of a set of stations as a structured array (see TRANSECT_DTYPE).
+    Each transect starts `inland_offset` meters inland from the station and extends `length` meters
+    toward the sea in the direction given by its angle.
+
+    Parameters:
+        stations (np.ndarray): (n, 2+) array with the x and y coordinates of the stations.
+        angles (np.ndarray): (n,) array with the transect directions in degrees (0-360, clockwise from north).
+        length (float): Length of the transects toward the sea in meters.
+        start_id (int): transect_id of the first transect.
+        baseline_id (int): baseline_id stored in all the transects.
+        inland_offset (float): Inland extension of the transects in meters.
+
+    Returns:
+        np.ndarray: Structured array with one row per transect.
+    """
+    stations = np.asarray(stations, dtype=float)
+    angles_rad = np.radians(np.asarray(angles, dtype=float))
+    sin, cos = np.sin(angles_rad), np.cos(angles_rad)
+
+    records = np.empty(len(stations), dtype=TRANSECT_DTYPE)
+    records['transect_id'] = start_id + np.arange(len(stations))
+    records['baseline_id'] = baseline_id
+    records['start_x'] = stations[:, 0] - inland_offset * sin
+    records['start_y'] = stations[:, 1] - inland_offset * cos
+    records['end_x'] = stations[:, 0] + length * sin
+    records['end_y'] = stations[:, 1] + length * cos
+
+    return records
+
+
+def transects_to_wkb(records):
+    """
+    Encodes the transects as two-point LineString WKB geometries in one vectorized pass.
+
+    Parameters:
+        records (np.ndarray): Structured array of transects (see TRANSECT_DTYPE).
+
+    Returns:
+        list: WKB (bytes) of each transect, in the same order as the records.
+    """
+    wkb = np.empty(len(records), dtype=_LINESTRING_WKB_DTYPE)
+    wkb['byte_order'] = 1  # Little endian
+    wkb['geom_type'] = 2  # LineString
+    wkb['num_points'] = 2
+    wkb['coords'] = np.column_stack((records['start_x'], records['start_y'],
+                                     records['end_x'], records['end_y']))
+
+    buffer = wkb.tobytes()
+    size = _LINESTRING_WKB_DTYPE.itemsize
+    return [buffer[i:i + size] for i in range(0, len(buffer), size)]
+
+
+def transect_angles(orientations, sea_side):
+    """
+    Computes the direction of the transects, perpendicular to the baseline orientation toward the sea.
+
+    Parameters:
+        orientations (np.ndarray): Baseline orientations in degrees (0-360).
+        sea_side (str): Side of the sea relative to the baseline direction ("Right" or "Left").
+
+    Returns:
+        np.ndarray: Transect directions in degrees (0-360).
+    """
+    orientations = np.asarray(orientations, dtype=float)
+    if sea_side == "Right":
+        # Perpendicular to the right (clockwise 90°)
+        return (orientations + 90) % 360
+    # Perpendicular to the left (counter-clockwise 90°)
+    return (orientations - 90) % 360
+
+
+def generate_feature_transects(parts, distance, length, sea_side, window_points=5, repair_crossings=False):
+    """
+    Generates the transects of a single baseline feature: stations, smoothed orientations and endpoints.
+    Only coordinate arrays are passed in and out, so it can be dispatched to worker processes.
+    If repair_crossings is True, the orientation of the transects that cross each other is smoothed
+    with increasingly larger windows (see smooth_crossing_transects).
+
+    Parameters:
+        parts (list): List of (n, 2) arrays with the vertex coordinates of each part of the baseline.
+        distance (float): Distance between transects in meters.
+        length (float): Length of each transect in meters.
+        sea_side (str): Side of the sea relative to the baseline direction ("Right" or "Left").
+        window_points (int): Number of stations on each side of the orientation smoothing window.
+        repair_crossings (bool): Whether to smooth the orientation of the crossing transects.
+
+    Returns:
+        records (np.ndarray): Structured array of transects (see TRANSECT_DTYPE), numbered from 1.
+        n_adjusted (int): Number of transects whose orientation was adjusted to remove crossings.
+    """
+    stations, _ = baseline_stations(parts, distance)
+    orientations = smoothed_orientations(stations, window_points)[:len(stations)]
+    records = transect_records(stations, transect_angles(orientations, sea_side), length)
+
+    n_adjusted = 0
+    if repair_crossings:
+        records, n_adjusted = smooth_crossing_transects(records, stations, orientations, length,
+                                                        sea_side, window_points)
+
+    return records, n_adjusted
+
+
+def baseline_fingerprint(parts, *params):
+    """
+    Computes a fingerprint of a baseline feature from its vertex coordinates and the generation parameters.
+    Two baseline features have the same fingerprint only if they would produce the same transects.
+
+    Parameters:
+        parts (list): List of (n, 2) arrays with the vertex coordinates of each part of the baseline.
+        *params: Generation parameters (distance, length, sea side, ...).
+
+    Returns:
+        str: Hexadecimal SHA-1 digest (40 characters).
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        coords = np.ascontiguousarray(part, dtype='<f8')
+        digest.update(np.int64(len(coords)).tobytes())
+        digest.update(coords.tobytes())
+    digest.update(repr(params).encode())
+    return digest.hexdigest()
+
+
+def assign_baseline_ids(current_ids, keep_existing=False):
+    """
+    Assigns the baseline_id of each baseline feature.
+    By default, the features are numbered from 1 in their order. With keep_existing (incremental mode), the
+    features that already have a valid ID keep it, so deleting or adding a feature does not shift the IDs of the
+    others; only the features without ID (or with an ID already used by a previous feature) get a new one,
+    after the current maximum.
+
+    Parameters:
+        current_ids (list): Current baseline_id of each feature (None if it is not set).
+        keep_existing (bool): Whether to keep the current IDs.
+
+    Returns:
+        list: baseline_id of each feature.
+    """
+    if not keep_existing:
+        return list(range(1, len(current_ids) + 1))
+    next_id = max([i for i in current_ids if i is not None and i > 0], default=0) + 1
+    used, new_ids = set(), []
+    for baseline_id in current_ids:
+        if baseline_id is None or baseline_id <= 0 or baseline_id in used:
+            baseline_id, next_id = next_id, next_id + 1
+        used.add(baseline_id)
+        new_ids.append(baseline_id)
+    return new_ids
+
+
+def baseline_changes(baseline_ids, fingerprints, existing_fps):
+    """
+    Compares the baseline features with the fingerprints stored with their transects.
+
+    Parameters:
+        baseline_ids (list): ID of each baseline feature (or None).
+        fingerprints (list): Fingerprint of each baseline feature.
+        existing_fps (dict): Set of fingerprints stored with the transects of each baseline ID.
+
+    Returns:
+        changed (list): Positions of the changed (or new) baseline features.
+        removed (set): IDs of the baseline features whose transects no longer have a feature.
+    """
+    changed = [i for i, (key, fp) in enumerate(zip(baseline_ids, fingerprints))
+               if existing_fps.get(key) != {fp}]
+    removed = set(existing_fps) - set(baseline_ids)
+    return changed, removed
+
+
+def transect_lines(records):
+    """
+    Builds the Shapely LineStrings of the transects.
+
+    Parameters:
+        records (np.ndarray): Structured array of transects (see TRANSECT_DTYPE).
+
+    Returns:
+        np.ndarray: Array of Shapely LineString objects.
+    """
+    if len(records) == 0:
+        return np.empty(0, dtype=object)
+    coords = np.column_stack((records['start_x'], records['start_y'],
+                              records['end_x'], records['end_y'])).reshape(-1, 2)
+    return shapely.linestrings(coords, indices=np.repeat(np.arange(len(records)), 2))
+
+
+def crossing_pairs(records):
+    """
+    Finds the pairs of transects that cross each other.
+    The transects are indexed in an STRtree, so the search is near-linear instead of checking every pair.
+
+    Parameters:
+        records (np.ndarray): Structured array of transects (see TRANSECT_DTYPE).
+
+    Returns:
+        np.ndarray: (2, m) array with the positions (i < j) of the crossing transects.
+    """
+    if len(records) < 2:
+        return np.empty((2, 0), dtype=np.intp)
+    lines = transect_lines(records)
+    pairs = shapely.STRtree(lines).query(lines, predicate='intersects')
+    return pairs[:, pairs[0] < pairs[1]]
+
+
+def segment_intersections(p_start, p_end, q_start, q_end):
+    """
+    Computes the intersection of pairs of segments P and Q in parametric form.
+    The intersection point is p_start + t * (p_end - p_start) = q_start + u * (q_end - q_start).
+
+    Parameters:
+        p_start, p_end (np.ndarray): (n, 2) arrays with the endpoints of the segments P.
+        q_start, q_end (np.ndarray): (n, 2) arrays with the endpoints of the segments Q.
+
+    Returns:
+        t (np.ndarray): (n,) parameter along P (NaN for parallel segments).
+        u (np.ndarray): (n,) parameter along Q (NaN for parallel segments).
+    """
+    r = p_end - p_start
+    s = q_end - q_start
+    qp = q_start - p_start
+    denom = r[:, 0] * s[:, 1] - r[:, 1] * s[:, 0]
+    parallel = denom == 0
+    denom = np.where(parallel, 1.0, denom)
+    t = (qp[:, 0] * s[:, 1] - qp[:, 1] * s[:, 0]) / denom
+    u = (qp[:, 0] * r[:, 1] - qp[:, 1] * r[:, 0]) / denom
+    t[parallel] = np.nan
+    u[parallel] = np.nan
+    return t, u
+
+
+def smooth_crossing_transects(records, stations, orientations, length, sea_side, window_points):
+    """
+    Removes the crossings between the transects of one baseline feature by locally increasing the smoothing.
+    In each round, the orientation of the crossing transects is replaced by the one obtained with
+    a window twice as large, keeping the rest of the transects unchanged.
+
+    Parameters:
+        records (np.ndarray): Structured array of transects (see TRANSECT_DTYPE).
+        stations (np.ndarray): (n, 2+) array with the coordinates of the stations of the transects.
+        orientations (np.ndarray): (n,) array with the baseline orientations at the stations.
+        length (float): Length of the transects in meters.
+        sea_side (str): Side of the sea relative to the baseline direction ("Right" or "Left").
+        window_points (int): Number of stations on each side of the initial smoothing window.
+
+    Returns:
+        records (np.ndarray): Structured array of the repaired transects.
+        n_adjusted (int): Number of transects whose orientation was adjusted.
+    """
+    adjusted = np.zeros(len(records), dtype=bool)
+    orientations = np.array(orientations, dtype=float)
+    window = max(int(window_points), 1)
+
+    for _ in range(SMOOTHING_ROUNDS):
+        pairs = crossing_pairs(records)
+        if pairs.size == 0:
+            break
+        involved = np.unique(pairs)
+        window *= 2
+        orientations[involved] = smoothed_orientations(stations, window)[involved]
+        adjusted[involved] = True
+        records = transect_records(stations, transect_angles(orientations, sea_side), length)
+
+    return records, int(adjusted.sum())
+
+
+def shorten_crossing_transects(records, inland_offset=INLAND_OFFSET, margin=CROSSING_MARGIN):
+    """
+    Removes the remaining crossings by shortening the seaward end of the crossing transects
+    to `margin` meters before their nearest crossing point. The transects are modified in place.
+    Crossings located inland of the baseline cannot be repaired this way and are left as they are.
+
+    Parameters:
+        records (np.ndarray): Structured array of transects (see TRANSECT_DTYPE).
+        inland_offset (float): Inland extension of the transects in meters.
+        margin (float): Distance kept between the new end of the transect and the crossing point.
+
+    Returns:
+        int: Number of transects shortened.
+    """
+    pairs = crossing_pairs(records)
+    if pairs.size == 0:
+        return 0
+
+    start = np.column_stack((records['start_x'], records['start_y']))
+    end = np.column_stack((records['end_x'], records['end_y']))
+    i, j = pairs
+    t, u = segment_intersections(start[i], end[i], start[j], end[j])
+    valid = ~np.isnan(t)
+
+    # Nearest crossing (as a fraction of the transect) of every transect
+    cut = np.full(len(records), np.inf)
+    np.minimum.at(cut, i[valid], t[valid])
+    np.minimum.at(cut, j[valid], u[valid])
+
+    # New length of the transects, keeping the intersection with the baseline
+    transect_length = np.hypot(*(end - start).T)
+    new_length = cut * transect_length - margin
+    shorten = np.isfinite(cut) & (new_length > inland_offset)
+
+    fraction = new_length[shorten] / transect_length[shorten]
+    records['end_x'][shorten] = start[shorten, 0] + fraction * (end[shorten, 0] - start[shorten, 0])
+    records['end_y'][shorten] = start[shorten, 1] + fraction * (end[shorten, 1] - start[shorten, 1])
+
+    return int(shorten.sum())
@@ -1,11 +1,16 @@
 import arcpy
-import math
+import time
 import numpy as np
 import pandas as pd
+import shapely
+from tools.utils.transect_engine import (TRANSECT_DTYPE, baseline_fingerprint, baseline_changes,
+                                         generate_feature_transects, shorten_crossing_transects, transects_to_wkb)
+from tools.utils.generic_funs import get_process_pool, resolve_workers
 
 
 class TransectGenerator(object):
-    def __init__(self, baseline_fc, distance, length, sea_side, output_fc):
+    def __init__(self, baseline_fc, distance, length, sea_side, output_fc, window_points=5, workers=1,
+                 repair_crossings=False, incremental=False):
         """
         This class generates transects along a baseline with intelligent smoothing to handle
         abrupt orientation changes and circular angle geometry (0° = 360°).
@@ -16,6 +21,10 @@ class TransectGenerator(object):
             length (float): Length of each transect in meters.
             sea_side (str): Direction to extend transects ("Right" or "Left" relative to baseline direction).
             output_fc (str): Path to the output transect feature class.
+            window_points (int): Number of points on each side of the orientation smoothing window.
+            workers (int): Number of worker processes used when there are several baseline features (0 = all cores).
+            repair_crossings (bool): Whether to detect and repair the transects that cross each other.
+            incremental (bool): Whether to regenerate only the transects of the baseline features that changed.
             
         Returns:
             None
@@ -25,6 +34,10 @@ class TransectGenerator(object):
         self.length = length
         self.sea_side = sea_side
         self.output_fc = output_fc
+        self.window_points = window_points
+        self.workers = resolve_workers(workers)
+        self.repair_crossings = repair_crossings
+        self.incremental = incremental
         self.spatial_ref = arcpy.Describe(baseline_fc).spatialReference
         
         # Check if baseline has multiple features
@@ -39,7 +52,21 @@ class TransectGenerator(object):
         """
         Main method to generate transects along the baseline.
         Processes each baseline feature independently if multiple features exist.
+        In incremental mode, only the baseline features whose fingerprint (geometry and
+        generation parameters) changed since the last run are regenerated.
         """
+        # Read the vertices of each baseline feature once
+        baseline_parts, baseline_ids = self._read_baselines()
+        
+        # Fingerprint each baseline feature with its geometry and the generation parameters
+        fingerprints = [baseline_fingerprint(parts, self.distance, self.length, self.sea_side,
+                                             self.window_points, self.repair_crossings)
+                        for parts in baseline_parts]
+        
+        if self.incremental and self._can_update_incrementally():
+            self._update_transects(baseline_parts, baseline_ids, fingerprints)
+            return self.output_fc
+        
         # Create output feature class
         arcpy.management.CreateFeatureclass(
             out_path=arcpy.env.workspace if arcpy.env.workspace else "in_memory",
@@ -55,9 +82,26 @@ class TransectGenerator(object):
         if self.has_baseline_id:
             arcpy.management.AddField(self.output_fc, "baseline_id", "SHORT")
         
-        # Generate transects for each baseline feature
-        transect_counter = 1
+        # Add the field with the fingerprint of the baseline feature of each transect
+        arcpy.management.AddField(self.output_fc, "baseline_fp", "TEXT", field_length=40)
+        
+        # Generate the transects of all the baseline features
+        transects, transect_fps = self._build_transects(baseline_parts, baseline_ids, fingerprints)
+        
+        # Insert all the transects into output feature class in a single pass
+        if len(transects):
+            self._insert_transects(transects, transect_fps)
+        
+        return self.output_fc
+    
+    def _read_baselines(self):
+        """
+        Read the vertices of each baseline feature.
         
+        Returns:
+            List with the parts (list of (n, 2) arrays) of each baseline feature
+            List with the ID of each baseline feature (or None)
+        """
         if self.has_baseline_id:
             # Process each baseline feature separately
             fields = ["SHAPE@", "baseline_id"]
@@ -65,222 +109,226 @@ class TransectGenerator(object):
             # Process all as single baseline
             fields = ["SHAPE@"]
         
+        baseline_parts = []
+        baseline_ids = []
         with arcpy.da.SearchCursor(self.baseline_fc, fields) as cursor:
             for row in cursor:
-                baseline_geom = row[0]
-                baseline_id = row[1] if self.has_baseline_id else None
-                
-                # Generate transects for this baseline feature
-                transects = self._generate_transects_for_feature(baseline_geom, baseline_id, transect_counter)
-                
-                # Insert transects into output feature class
-                transect_counter = self._insert_transects(transects, transect_counter)
+                baseline_parts.append(self._geometry_to_parts(row[0]))
+                baseline_ids.append(row[1] if self.has_baseline_id else None)
         
-        return self.output_fc
+        return baseline_parts, baseline_ids
     
-    def _generate_transects_for_feature(self, baseline_geom, baseline_id, start_id):
+    def _build_transects(self, baseline_parts, baseline_ids, fingerprints):
         """
-        Generate transects for a single baseline feature with smoothed orientations.
+        Generate, merge and repair the transects of a set of baseline features.
         
         Parameters:
-            baseline_geom: Polyline geometry of the baseline
-            baseline_id: ID of the baseline feature (or None)
-            start_id: Starting transect ID
+            baseline_parts: List with the parts (list of (n, 2) arrays) of each baseline feature
+            baseline_ids: List with the ID of each baseline feature (or None)
+            fingerprints: List with the fingerprint of each baseline feature
             
         Returns:
-            List of tuples: [(geometry, transect_id, baseline_id), ...]
+            np.ndarray: Structured array with the transects, numbered from 1 (see transect_engine.TRANSECT_DTYPE)
+            np.ndarray: Fingerprint of the baseline feature of each transect
         """
-        transects = []
-        
-        # Get points along the baseline at specified intervals
-        points_data = self._get_baseline_points(baseline_geom)
+        # Generate transects for each baseline feature (in a process pool if several workers are requested)
+        if self.workers > 1 and len(baseline_parts) > 1:
+            feature_transects = self._generate_transects_parallel(baseline_parts)
+        else:
+            feature_transects = [self._generate_transects_for_feature(parts) for parts in baseline_parts]
         
-        # Calculate smoothed orientations using circular geometry
-        orientations = self._calculate_smoothed_orientations(points_data)
+        # Merge the transects with contiguous IDs following the order of the baseline features
+        transects = self._merge_transects([records for records, _ in feature_transects], baseline_ids)
+        transect_fps = np.repeat(np.array(fingerprints, dtype=object),
+                                 [len(records) for records, _ in feature_transects])
         
-        # Generate transect geometries
-        for i, (point, orientation) in enumerate(zip(points_data, orientations)):
-            # Calculate perpendicular angle based on sea side
-            transect_angle = self._calculate_transect_angle(orientation)
-            
-            # Create transect geometry
-            transect_geom = self._create_transect_geometry(point, transect_angle)
-            
-            # Store transect data
-            transect_id = start_id + i
-            transects.append((transect_geom, transect_id, baseline_id))
+        # Repair the crossing transects that could not be solved by smoothing (e.g. between baseline features)
+        if self.repair_crossings:
+            n_smoothed = sum(n_adjusted for _, n_adjusted in feature_transects)
+            n_shortened = shorten_crossing_transects(transects)
+            arcpy.AddMessage(f"Crossing transects repaired: {n_smoothed} adjusted by local smoothing "
+                             f"and {n_shortened} shortened at their seaward end.")
         
-        return transects
+        return transects, transect_fps
+    
+    def _can_update_incrementally(self):
+        """
+        Check if the output feature class can be updated incrementally: it must exist, store the
+        fingerprints of the baseline features and have the same baseline_id schema as the baseline.
+        """
+        if not arcpy.Exists(self.output_fc):
+            return False
+        field_names = [f.name for f in arcpy.ListFields(self.output_fc)]
+        return 'baseline_fp' in field_names and ('baseline_id' in field_names) == self.has_baseline_id
     
-    def _get_baseline_points(self, baseline_geom):
+    def _update_transects(self, baseline_parts, baseline_ids, fingerprints):
         """
-        Get points along the baseline at specified intervals.
-        The first transect has a small longitudinal offset to avoid further spatial operations 
-        mismatches due to placing it exactly at the baseline start.
+        Regenerate only the transects of the baseline features that changed (or are new) and delete the
+        transects of the removed features. The transects of the unchanged features are left untouched and
+        the regenerated ones reuse the transect_ids previously assigned to their baseline feature
+        (new IDs are only assigned when the feature has more transects than before).
+        Crossings are only repaired among the regenerated transects.
         
         Parameters:
-            baseline_geom: Polyline geometry
+            baseline_parts: List with the parts (list of (n, 2) arrays) of each baseline feature
+            baseline_ids: List with the ID of each baseline feature (or None)
+            fingerprints: List with the fingerprint of each baseline feature
             
         Returns:
-            List of (x, y, distance_along) tuples
+            None
         """
-        points_data = []
-        total_length = baseline_geom.length
-        
-        # Generate points at specified intervals
-        # Start with a small longitudinal offset (1m) for the first transect
-        longitudinal_offset = 1.0  # meters
-        current_distance = longitudinal_offset
-        
-        while current_distance <= total_length:
-            point = baseline_geom.positionAlongLine(current_distance)
-            centroid = point.centroid
-            points_data.append((centroid.X, centroid.Y, current_distance))
-            current_distance += self.distance
-        
-        return points_data
+        # Read the transect IDs and fingerprints stored for each baseline feature
+        fields = ["transect_id", "baseline_fp"] + (["baseline_id"] if self.has_baseline_id else [])
+        existing_ids, existing_fps = {}, {}
+        with arcpy.da.SearchCursor(self.output_fc, fields) as cursor:
+            for row in cursor:
+                key = row[2] if self.has_baseline_id else None
+                existing_ids.setdefault(key, []).append(row[0])
+                existing_fps.setdefault(key, set()).add(row[1])
+        
+        # Find the changed (or new) and the removed baseline features
+        changed, removed = baseline_changes(baseline_ids, fingerprints, existing_fps)
+        
+        if not changed and not removed:
+            arcpy.AddMessage("The transects are up to date with the baseline, nothing to regenerate.")
+            return
+        
+        # Generate the transects of the changed baseline features only
+        transects, transect_fps = self._build_transects([baseline_parts[i] for i in changed],
+                                                        [baseline_ids[i] for i in changed],
+                                                        [fingerprints[i] for i in changed])
+        
+        # Keep the transect IDs stable: reuse the IDs of each regenerated feature and append new ones after the maximum
+        next_id = max((max(ids) for ids in existing_ids.values()), default=0) + 1
+        for i in changed:
+            key = baseline_ids[i]
+            block = np.flatnonzero(transects['baseline_id'] == (key if key is not None else 0))
+            old_ids = sorted(existing_ids.get(key, []))[:len(block)]
+            n_new = len(block) - len(old_ids)
+            transects['transect_id'][block] = old_ids + list(range(next_id, next_id + n_new))
+            next_id += n_new
+        
+        # Delete the transects of the changed and removed baseline features
+        keys_to_delete = {baseline_ids[i] for i in changed} | removed
+        with arcpy.da.UpdateCursor(self.output_fc, fields) as cursor:
+            for row in cursor:
+                if (row[2] if self.has_baseline_id else None) in keys_to_delete:
+                    cursor.deleteRow()
+        
+        # Insert the regenerated transects
+        if len(transects):
+            self._insert_transects(transects, transect_fps)
+        arcpy.AddMessage(f"Incremental update: {len(changed)} baseline features regenerated "
+                         f"and {len(removed)} removed.")
     
-    def _calculate_smoothed_orientations(self, points_data):
+    def _generate_transects_for_feature(self, baseline_parts):
         """
-        Calculate smoothed orientations at each point using circular averaging.
-        Uses a moving window to smooth out abrupt changes in baseline direction.
+        Generate transects for a single baseline feature with smoothed orientations.
         
         Parameters:
-            points_data: List of (x, y, distance_along) tuples
+            baseline_parts: List of (n, 2) arrays with the vertex coordinates of each part of the baseline
             
         Returns:
-            List of smoothed orientations in degrees (0-360)
+            np.ndarray: Structured array with the transect_id, baseline_id and endpoints
+                        of each transect (see transect_engine.TRANSECT_DTYPE)
+            int: Number of transects adjusted by local smoothing to remove crossings
         """
-        if len(points_data) < 2:
-            return [0]  # Default orientation if insufficient points
-        
-        # Window size for smoothing (number of points on each side)
-        window_points = 5
-        
-        orientations = []
-        
-        for i in range(len(points_data)):
-            # Define window bounds
-            start_idx = max(0, i - window_points)
-            end_idx = min(len(points_data) - 1, i + window_points)
-            
-            # Extract window points
-            window = points_data[start_idx:end_idx + 1]
-            
-            if len(window) < 2:
-                # Use simple bearing if window too small
-                if i > 0:
-                    dx = points_data[i][0] - points_data[i-1][0]
-                    dy = points_data[i][1] - points_data[i-1][1]
-                else:
-                    dx = points_data[i+1][0] - points_data[i][0]
-                    dy = points_data[i+1][1] - points_data[i][1]
-                angle = math.degrees(math.atan2(dx, dy)) % 360
-                orientations.append(angle)
-                continue
-            
-            # Calculate bearing vectors between consecutive points in window
-            vectors_x = []
-            vectors_y = []
-            
-            for j in range(len(window) - 1):
-                dx = window[j+1][0] - window[j][0]
-                dy = window[j+1][1] - window[j][1]
-                
-                # Convert to unit vector with angle
-                angle = math.atan2(dx, dy)  # Bearing angle in radians
-                vectors_x.append(math.sin(angle))
-                vectors_y.append(math.cos(angle))
-            
-            # Average vectors (circular mean)
-            mean_x = np.mean(vectors_x)
-            mean_y = np.mean(vectors_y)
-            
-            # Convert back to angle
-            smoothed_angle = math.degrees(math.atan2(mean_x, mean_y)) % 360
-            orientations.append(smoothed_angle)
-        
-        return orientations
+        return generate_feature_transects(baseline_parts, self.distance, self.length,
+                                          self.sea_side, self.window_points, self.repair_crossings)
     
-    def _calculate_transect_angle(self, baseline_orientation):
+    def _generate_transects_parallel(self, baseline_parts):
         """
-        Calculate the angle for the transect based on baseline orientation and sea side.
+        Generate the transects of several baseline features in a process pool.
+        Each worker only receives the coordinate arrays of one baseline feature at a time.
         
         Parameters:
-            baseline_orientation: Orientation of baseline in degrees (0-360)
+            baseline_parts: List with the parts (list of (n, 2) arrays) of each baseline feature
             
         Returns:
-            Transect angle in degrees (0-360)
+            List of (structured array of transects, number of adjusted transects) tuples,
+            in the same order as the baseline features
         """
-        # Calculate perpendicular angle
-        if self.sea_side == "Right":
-            # Perpendicular to the right (clockwise 90°)
-            transect_angle = (baseline_orientation + 90) % 360
-        else:  # "Left"
-            # Perpendicular to the left (counter-clockwise 90°)
-            transect_angle = (baseline_orientation - 90) % 360
-        
-        return transect_angle
+        n = len(baseline_parts)
+        arcpy.AddMessage(f"Generating the transects of {n} baseline features with {self.workers} workers...")
+        # Send the features in chunks to reduce the inter-process communication overhead
+        chunksize = max(1, n // (self.workers * 4))
+        with get_process_pool(self.workers) as pool:
+            return list(pool.map(generate_feature_transects, baseline_parts,
+                                 [self.distance] * n, [self.length] * n,
+                                 [self.sea_side] * n, [self.window_points] * n,
+                                 [self.repair_crossings] * n, chunksize=chunksize))
     
-    def _create_transect_geometry(self, point, angle):
+    @staticmethod
+    def _merge_transects(feature_transects, baseline_ids):
         """
-        Create a transect line geometry from a point extending in the specified direction.
-        The transect extends slightly inland (0.5m) to ensure intersection with baseline,
-        then extends the full length toward the sea.
+        Merge the transects of all the baseline features assigning contiguous transect IDs
+        (starting from 1) in the order of the baseline features, so the numbering is deterministic
+        whether the transects were generated serially or in parallel.
         
         Parameters:
-            point: Tuple (x, y) of the baseline point
-            angle: Angle in degrees (0-360) for transect direction
+            feature_transects: List of structured arrays of transects of each baseline feature
+            baseline_ids: List with the ID of each baseline feature (or None)
             
         Returns:
-            Polyline geometry
+            np.ndarray: Structured array with all the transects
         """
-        baseline_x, baseline_y = point[0], point[1]
+        if not feature_transects:
+            return np.empty(0, dtype=TRANSECT_DTYPE)
         
-        # Convert angle to radians
-        angle_rad = math.radians(angle)
-        
-        # Calculate start point: 0.5m inland from baseline (opposite direction)
-        inland_offset = 0.5  # meters
-        start_x = baseline_x - inland_offset * math.sin(angle_rad)
-        start_y = baseline_y - inland_offset * math.cos(angle_rad)
-        
-        # Calculate end point: full length from baseline toward sea
-        end_x = baseline_x + self.length * math.sin(angle_rad)
-        end_y = baseline_y + self.length * math.cos(angle_rad)
+        transect_counter = 1
+        for records, baseline_id in zip(feature_transects, baseline_ids):
+            records['transect_id'] = transect_counter + np.arange(len(records))
+            records['baseline_id'] = baseline_id if baseline_id is not None else 0
+            transect_counter += len(records)
         
-        # Create polyline from inland to sea
-        array = arcpy.Array([
-            arcpy.Point(start_x, start_y),
-            arcpy.Point(end_x, end_y)
-        ])
+        return np.concatenate(feature_transects)
+    
+    @staticmethod
+    def _geometry_to_parts(geometry):
+        """
+        Extract the vertex coordinates of each part of a polyline geometry.
         
-        return arcpy.Polyline(array, self.spatial_ref)
+        Parameters:
+            geometry: Polyline geometry
+            
+        Returns:
+            List of (n, 2) arrays with the coordinates of the vertices of each part
+        """
+        return [np.array([(pnt.X, pnt.Y) for pnt in part if pnt is not None]) for part in geometry]
     
-    def _insert_transects(self, transects, start_id):
+    def _insert_transects(self, transects, transect_fps):
         """
         Insert generated transects into the output feature class.
+        All the transects are written in a single pass of one InsertCursor, with their
+        geometries encoded as WKB in one batch instead of building one Polyline per transect.
         
         Parameters:
-            transects: List of (geometry, transect_id, baseline_id) tuples
-            start_id: Starting transect ID
+            transects: Structured array of transects (see transect_engine.TRANSECT_DTYPE)
+            transect_fps: Fingerprint of the baseline feature of each transect
             
         Returns:
             Next available transect ID
         """
+        start_time = time.perf_counter()
+        
+        geometries = transects_to_wkb(transects)
         if self.has_baseline_id:
-            fields = ["SHAPE@", "transect_id", "baseline_id"]
+            fields = ["SHAPE@WKB", "transect_id", "baseline_fp", "baseline_id"]
+            rows = zip(geometries, transects['transect_id'].tolist(), transect_fps, transects['baseline_id'].tolist())
         else:
-            fields = ["SHAPE@", "transect_id"]
+            fields = ["SHAPE@WKB", "transect_id", "baseline_fp"]
+            rows = zip(geometries, transects['transect_id'].tolist(), transect_fps)
         
         with arcpy.da.InsertCursor(self.output_fc, fields) as cursor:
-            for transect_geom, transect_id, baseline_id in transects:
-                if self.has_baseline_id:
-                    cursor.insertRow([transect_geom, transect_id, baseline_id])
-                else:
-                    cursor.insertRow([transect_geom, transect_id])
+            for row in rows:
+                cursor.insertRow(row)
+        
+        # Report the writing throughput
+        elapsed = time.perf_counter() - start_time
+        arcpy.AddMessage(f"{len(transects)} transects written in {elapsed:.2f} s "
+                         f"({len(transects) / max(elapsed, 1e-9):.0f} rows/s).")
         
-        return start_id + len(transects)
+        return int(transects['transect_id'].max()) + 1 if len(transects) else 1
 
 
 class RotateFeatures(object):
@@ -288,6 +336,8 @@ class RotateFeatures(object):
         """
         This class rotates the features of a polyline feature class.
         The class rotates the vertices of the polylines based on the angle calculated in the previous class.
+        All the vertices and centroids are read as arrays and rotated in one vectorized operation,
+        then the geometries and the angles are written back in a single update pass.
         
         Parameters:
             df (DataFrame): The DataFrame with the transects.
@@ -301,46 +351,46 @@ class RotateFeatures(object):
         """
         # Add an angle field to the feature class
         arcpy.management.AddField(fclass, 'Angle', 'DOUBLE')
-        # Update the angle field with the values calculated in the previous class
-        with arcpy.da.UpdateCursor(fclass, 'Angle') as cursor:
-            for i, row in enumerate(cursor):
-                cursor.updateRow([df.loc[i, 'Angle']])
 
-        # Rebuild each polyine with rotated vertices
-        with arcpy.da.UpdateCursor(fclass, ['SHAPE@', 'Angle']) as cursor:
+        # Read the geometries and their centroids (pivot points) in one pass
+        wkb_list, centroids = [], []
+        with arcpy.da.SearchCursor(fclass, ['SHAPE@WKB', 'SHAPE@XY']) as cursor:
             for row in cursor:
-                # Create a list to store the rotated vertices
-                linelist = []
-                for part in row[0]: # Iterate over the parts of the polyline
-                    # Create a list to store the rotated points
-                    partlist = []
-                    for pnt in part: # Iterate over the vertices of the polyline
-                        if pnt is not None:
-                            # Rotate the points based on the angle
-                            partlist.append(self.rotatepoint(pnt, row[0].centroid, row[1])) # Centroid is pivot point
-                    # Append the rotated points to the list
-                    linelist.append(partlist)
-                # Update the row with the rotated vertices
-                row[0] = arcpy.Polyline(arcpy.Array(linelist))
-                cursor.updateRow(row)
+                wkb_list.append(row[0])
+                centroids.append(row[1])
+        centroids = np.array(centroids, dtype=float).reshape(-1, 2)
+
+        # Angles calculated in the previous class, aligned with the order of the features
+        angles = df['Angle'].reindex(np.arange(len(wkb_list))).to_numpy(dtype=float)
+
+        # Rotate all the vertices of all the polylines at once
+        geometries = shapely.force_2d(shapely.from_wkb(wkb_list))
+        coords, feature_idx = shapely.get_coordinates(geometries, return_index=True)
+        rotated = self.rotate_coordinates(coords, centroids[feature_idx], angles[feature_idx])
+        geometries = shapely.set_coordinates(geometries, rotated)
+
+        # Update the angle field and the geometries with the rotated vertices
+        with arcpy.da.UpdateCursor(fclass, ['SHAPE@WKB', 'Angle']) as cursor:
+            for i, row in enumerate(cursor):
+                cursor.updateRow([shapely.to_wkb(geometries[i]), angles[i]])
 
     @staticmethod
-    def rotatepoint(point, pivotpoint, angle):
+    def rotate_coordinates(coords, pivots, angles):
         """
-        This method rotates a point around a pivot point.
-        The method uses the pivot point as the center of the rotation.
+        This method rotates an array of points around their pivot points.
+        The sine and cosine are evaluated once for the whole array.
         
         Parameters:
-            point (Point): The point to rotate.
-            pivotpoint (Point): The pivot point.
-            angle (float): The angle to rotate.
+            coords (np.ndarray): (n, 2) array with the coordinates of the points to rotate.
+            pivots (np.ndarray): (n, 2) array with the coordinates of the pivot point of each point.
+            angles (np.ndarray): (n,) array with the angle (degrees, clockwise) to rotate each point.
             
         Returns:
-            Point: The rotated point.
+            np.ndarray: (n, 2) array with the rotated coordinates.
         """
-        angle_rad = - math.radians(angle)
-        ox, oy = pivotpoint.X, pivotpoint.Y
-        px, py = point.X, point.Y
-        qx = ox + math.cos(angle_rad) * (px - ox) - math.sin(angle_rad) * (py - oy)
-        qy = oy + math.sin(angle_rad) * (px - ox) + math.cos(angle_rad) * (py - oy)    
-        return arcpy.Point(qx, qy)
+        angles_rad = - np.radians(angles)
+        cos, sin = np.cos(angles_rad), np.sin(angles_rad)
+        dx, dy = coords[:, 0] - pivots[:, 0], coords[:, 1] - pivots[:, 1]
+        qx = pivots[:, 0] + cos * dx - sin * dy
+        qy = pivots[:, 1] + sin * dx + cos * dy
+        return np.column_stack((qx, qy))
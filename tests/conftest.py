@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The toolbox imports its modules as "tools.utils...", relative to the src folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
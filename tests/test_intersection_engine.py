@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from shapely.geometry import LineString, MultiLineString
+
+from tools.utils.intersection_engine import (INTERSECTION_DTYPE, TransectIndex, intersect_shorelines_analytic,
+                                              intersect_shorelines_indexed)
+
+"""
+Cross-checks of the analytic intersection engine against the GEOS engine (intersection_engine.py does not
+depend on arcpy, so it can be tested outside ArcGIS Pro).
+"""
+
+
+def transects(n=5, spacing=10.0, length=100.0):
+    """Parallel two-point transects along the y axis, from y=0 (landward) to y=length (seaward)."""
+    return {i + 1: LineString([(i * spacing, 0.0), (i * spacing, length)]) for i in range(n)}
+
+
+def assert_same_points(geos, analytic):
+    """Both engines must return the same rows (same IDs and order, same coordinates up to rounding)."""
+    assert geos.dtype == analytic.dtype == INTERSECTION_DTYPE
+    assert len(geos) == len(analytic)
+    for field in ['transect_id', 'shore_id', 'part_index']:
+        np.testing.assert_array_equal(geos[field], analytic[field])
+    for field in ['x', 'y', 't_along']:
+        np.testing.assert_allclose(geos[field], analytic[field], rtol=0, atol=1e-9)
+
+
+def run_both(transects_feature, shorelines_feature):
+    index = TransectIndex(transects_feature)
+    return (intersect_shorelines_indexed(index, shorelines_feature),
+            intersect_shorelines_analytic(index, shorelines_feature))
+
+
+def test_single_crossings():
+    shorelines = {10: LineString([(-5, 40), (45, 42)]), 20: LineString([(-5, 60), (20, 55), (45, 70)])}
+    geos, analytic = run_both(transects(), shorelines)
+    assert len(geos) == 10
+    assert_same_points(geos, analytic)
+
+
+def test_multipoint_hits():
+    # The shoreline crosses each transect several times (MultiPoint intersections)
+    meander = LineString([(-5, 30), (15, 35), (5, 45), (15, 55), (5, 65), (45, 70)])
+    geos, analytic = run_both(transects(), {1: meander})
+    assert np.sum(geos['transect_id'] == 2) == 5
+    assert_same_points(geos, analytic)
+
+
+def test_multipart_shorelines():
+    # Only the points of the last intersecting part of each shoreline are kept for each transect
+    shoreline = MultiLineString([[(-5, 20), (45, 25)], [(-5, 50), (15, 55)], [(25, 80), (45, 80)]])
+    geos, analytic = run_both(transects(), {7: shoreline})
+    np.testing.assert_array_equal(geos['part_index'], [1, 1, 0, 2, 2])
+    assert_same_points(geos, analytic)
+
+
+def test_vertex_hits():
+    # The transects pass exactly through vertices of the shoreline: one point per vertex, not two
+    shoreline = LineString([(-5, 40), (0, 45), (10, 40), (20, 45), (30, 40), (40, 45), (45, 40)])
+    geos, analytic = run_both(transects(), {3: shoreline})
+    np.testing.assert_array_equal(geos['transect_id'], [1, 2, 3, 4, 5])
+    assert_same_points(geos, analytic)
+
+
+def test_shoreline_ending_on_transect():
+    # The last vertex of the shoreline lies on a transect
+    geos, analytic = run_both(transects(), {4: LineString([(-5, 40), (20, 50)])})
+    np.testing.assert_array_equal(geos['transect_id'], [1, 2, 3])
+    assert_same_points(geos, analytic)
+
+
+@pytest.mark.parametrize("overlap", [[(10, 30), (10, 60)], [(10, 60), (10, 30)]])
+def test_collinear_segments(overlap):
+    # A shoreline segment lies on transect 2. GEOS represents the overlap by its first vertex, while the analytic
+    # engine skips the collinear segment and reports the vertex where the next segment leaves the transect.
+    # Both give a single point at one end of the overlap, and the same points on the other transects.
+    shoreline = LineString([(-5, overlap[0][1])] + overlap + [(25, overlap[1][1])])
+    geos, analytic = run_both(transects(), {5: shoreline})
+    for hits in (geos, analytic):
+        on_transect = hits[hits['transect_id'] == 2]
+        assert len(on_transect) == 1
+        assert on_transect['x'][0] == 10 and on_transect['y'][0] in (30, 60)
+    assert_same_points(geos[geos['transect_id'] != 2], analytic[analytic['transect_id'] != 2])
+
+
+def test_no_intersections():
+    geos, analytic = run_both(transects(), {1: LineString([(-5, 150), (45, 150)])})
+    assert len(geos) == len(analytic) == 0
+    assert_same_points(geos, analytic)
+
+
+def test_random_shorelines():
+    rng = np.random.default_rng(0)
+    x = np.linspace(-5, 45, 200)
+    shorelines = {shore_id: LineString(np.column_stack([x, 50 + np.cumsum(rng.normal(0, 2, len(x)))]))
+                  for shore_id in range(1, 21)}
+    geos, analytic = run_both(transects(), shorelines)
+    assert len(geos) > 0
+    assert_same_points(geos, analytic)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from tools.utils.transect_engine import assign_baseline_ids, baseline_changes, baseline_fingerprint
+
+"""
+Checks of the incremental regeneration of the transects (transect_engine.py does not depend on arcpy).
+"""
+
+PARAMS = (100.0, 300.0, "Left", 5, False)
+
+
+def baselines(n=4):
+    """Parallel straight baseline features (one part each)."""
+    return [[np.array([(0.0, 1000.0 * i), (5000.0, 1000.0 * i + 100.0)])] for i in range(n)]
+
+
+def stored_fingerprints(features, baseline_ids):
+    """Fingerprints stored with the transects of each baseline ID after a run."""
+    return {key: {baseline_fingerprint(parts, *PARAMS)} for key, parts in zip(baseline_ids, features)}
+
+
+def run_incremental(features, current_ids, existing_fps):
+    """IDs of the baseline features and changes found by an incremental run."""
+    baseline_ids = assign_baseline_ids(current_ids, keep_existing=True)
+    fingerprints = [baseline_fingerprint(parts, *PARAMS) for parts in features]
+    return baseline_ids, baseline_changes(baseline_ids, fingerprints, existing_fps)
+
+
+def test_assign_baseline_ids():
+    assert assign_baseline_ids([None, None, None]) == [1, 2, 3]
+    assert assign_baseline_ids([3, 1, 7]) == [1, 2, 3]
+    assert assign_baseline_ids([3, 1, 7], keep_existing=True) == [3, 1, 7]
+    # Features without ID (or with a repeated ID, e.g. copied) are numbered after the maximum
+    assert assign_baseline_ids([2, None, 5, 2, 0], keep_existing=True) == [2, 6, 5, 7, 8]
+
+
+def test_unchanged_baseline():
+    features = baselines()
+    existing_fps = stored_fingerprints(features, [1, 2, 3, 4])
+    baseline_ids, (changed, removed) = run_incremental(features, [1, 2, 3, 4], existing_fps)
+    assert baseline_ids == [1, 2, 3, 4]
+    assert changed == [] and removed == set()
+
+
+def test_delete_middle_feature_regenerates_nothing_else():
+    features = baselines()
+    existing_fps = stored_fingerprints(features, [1, 2, 3, 4])
+    # The second feature is deleted: the others keep their IDs, so only its transects are removed
+    baseline_ids, (changed, removed) = run_incremental(features[:1] + features[2:], [1, 3, 4], existing_fps)
+    assert baseline_ids == [1, 3, 4]
+    assert changed == [] and removed == {2}
+
+
+def test_redigitised_feature_regenerates_only_itself():
+    features = baselines()
+    existing_fps = stored_fingerprints(features, [1, 2, 3, 4])
+    # The second feature is deleted and digitised again (new feature at the end without baseline_id)
+    redrawn = [features[1][0] + np.array([0.0, 10.0])]
+    new_features = features[:1] + features[2:] + [redrawn]
+    baseline_ids, (changed, removed) = run_incremental(new_features, [1, 3, 4, None], existing_fps)
+    assert baseline_ids == [1, 3, 4, 5]
+    assert changed == [3] and removed == {2}
+
+
+def test_edited_feature_regenerates_only_itself():
+    features = baselines()
+    existing_fps = stored_fingerprints(features, [1, 2, 3, 4])
+    features[2] = [features[2][0] + np.array([0.0, 10.0])]
+    _, (changed, removed) = run_incremental(features, [1, 2, 3, 4], existing_fps)
+    assert changed == [2] and removed == set()